@@ -0,0 +1,108 @@
+"""
+append_hash - hash only what a growing file has added
+
+a log that gains a line every second is read from byte zero every time
+it changes, though all but its last few bytes were hashed before. so for
+each big file we keep the hasher as it stood at the end of the last look,
+and when the file has only grown, that hasher is copied and fed just the
+new tail.
+
+"only grown" is taken on trust from cheap evidence: the same inode, a
+bigger size, and the same first and last blocks where the old end was.
+a file rewritten in place that keeps its head and that boundary block
+but changes bytes between them would be missed until its next full
+hash, which is why this is opt-in.
+
+hash states can't be saved (hashlib won't export them), so the savings
+last for the life of the process: a watch loop, not a one-shot scan.
+"""
+
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+# files smaller than this are cheap to hash again and aren't remembered
+APPEND_MIN = 1 << 20
+# how many files' hash states are held at once, least recently used dropped first
+APPEND_FILES = 256
+# bytes at the start of the file and before the old end that must match
+CHECK_BLOCK = 4096
+CHUNK = 1 << 20
+
+Held = namedtuple("Held", "algorithm size hasher check")
+
+
+def _check(fd, size: int) -> bytes:
+    """a digest of the head block and the block ending at size"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(os.pread(fd, min(CHECK_BLOCK, size), 0))
+    h.update(os.pread(fd, min(CHECK_BLOCK, size), max(0, size - CHECK_BLOCK)))
+    return h.digest()
+
+
+def _feed(fd, hasher, offset: int) -> int:
+    """hash from offset to the end of the file; returns where the end was"""
+    while True:
+        chunk = os.pread(fd, CHUNK, offset)
+        if not chunk:
+            return offset
+        hasher.update(chunk)
+        offset += len(chunk)
+
+
+class AppendCache:
+    """hash states of big files, kept to resume hashing where they left off"""
+
+    def __init__(self, min_size=APPEND_MIN, max_files=APPEND_FILES):
+        self.min_size = min_size
+        self.max_files = max_files
+        self._held = {}
+        self._lock = threading.Lock()
+        self.resumed = 0
+        self.bytes_skipped = 0
+
+    def digest(self, path, st, algorithm: str, factory) -> str | None:
+        """
+        the full hex digest of path (stat st), hashing only the appended
+        tail when an earlier look at the same file vouches for the rest
+        """
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            held = self._held.pop(key, None)
+
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            hasher = None
+            start = 0
+            if (held is not None and held.algorithm == algorithm and held.size < st.st_size
+                    and _check(fd, held.size) == held.check):
+                hasher = held.hasher.copy()
+                start = held.size
+            if hasher is None:
+                hasher = factory()
+            end = _feed(fd, hasher, start)
+            if end >= self.min_size:
+                self._hold(key, Held(algorithm, end, hasher.copy(), _check(fd, end)))
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+
+        if start:
+            self.resumed += 1
+            self.bytes_skipped += start
+        return hasher.hexdigest()
+
+    def _hold(self, key, held: Held):
+        with self._lock:
+            self._held[key] = held
+            while len(self._held) > self.max_files:
+                # dicts keep insertion order and digest() re-inserts, so the first is the stalest
+                del self._held[next(iter(self._held))]
+
+    def __len__(self):
+        return len(self._held)
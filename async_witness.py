@@ -0,0 +1,251 @@
+"""
+async_witness - witness for an asyncio event loop
+
+the same watching as witness.py, without a thread per tree:
+
+    async for batch in AsyncWitness("~/project"):
+        for change in batch.changes:
+            print(*change)
+
+scans and hashes run on an executor, inotify is read straight from the
+event loop, and any number of trees can be watched side by side with
+watch_many(). cancelling the consuming task stops the watch and
+releases its descriptors.
+
+watch_value() is the same idea for a single value that is polled, such
+as a state file: it yields (old, new) each time the value changes.
+"""
+
+import asyncio
+import functools
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import inotify_watch
+import pacing
+from ignore_rules import IgnoreRules
+from witness import (
+    DEFAULT_ALGORITHM,
+    HAS_INOTIFY,
+    Coalescer,
+    change_entries,
+    compare_states,
+    rescan_paths,
+    scan_directory,
+)
+
+
+class ChangeBatch(namedtuple("ChangeBatch", "root changes before after")):
+    """one report: changes as compare_states gives them, and the entries on either side"""
+
+    __slots__ = ()
+
+    def entries(self, change):
+        """(before entry, after entry) for one of this batch's changes"""
+        return change_entries(change, self.before, self.after)
+
+
+class AsyncWitness:
+    """
+    watch one directory tree; iterate to receive ChangeBatches
+
+    options are witness_loop's: backend ("auto", "inotify", "poll"),
+    interval (or a pacing.Pacer) for polling, quiet for coalescing, ignore
+    (an IgnoreRules; by default the tree's .witnessignore files) and the
+    scan options.
+    the initial scan happens on first iteration, or on await start().
+    """
+
+    def __init__(self, path, interval=2.0, recursive=True, max_depth=None, backend="auto",
+                 jobs=None, algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False,
+                 quiet=0.0, executor=None, pacer=None, ignore=None):
+        self.root = Path(path).expanduser().resolve()
+        self.interval = interval
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.backend = backend
+        self.jobs = jobs
+        self.algorithm = algorithm
+        self.sample_above = sample_above
+        self.escalate = escalate
+        self.quiet = quiet
+        self.executor = executor
+        self.pacer = pacer or pacing.Pacer(interval)
+        self._wait = self.pacer.base
+        self.ignore = ignore if ignore is not None else IgnoreRules(self.root)
+        self.state = None
+        self.watcher = None
+
+    def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def _look(self):
+        """
+        scan and compare, on the executor: (changes, before, cpu seconds).
+        the cpu is this thread's own, so other roots' scans and whatever
+        else the event loop ran meanwhile don't count against the budget
+        """
+        started = time.thread_time()
+        new_state = scan_directory(self.root, self.recursive, self.max_depth, previous=self.state,
+                                   jobs=self.jobs, algorithm=self.algorithm,
+                                   sample_above=self.sample_above, escalate=self.escalate,
+                                   ignore=self.ignore)
+        changes = compare_states(self.state, new_state)
+        before, self.state = self.state, new_state
+        return changes, before, time.thread_time() - started
+
+    def _scan(self, previous=None):
+        return self._run(scan_directory, self.root, self.recursive, self.max_depth,
+                         previous=previous, jobs=self.jobs, algorithm=self.algorithm,
+                         sample_above=self.sample_above, escalate=self.escalate, ignore=self.ignore)
+
+    async def start(self) -> dict:
+        """set up the watch and take the first look; returns the state"""
+        if self.state is not None:
+            return self.state
+        if self.backend != "poll" and HAS_INOTIFY:
+            try:
+                self.watcher = inotify_watch.InotifyWatcher(self.root, self.recursive, self.max_depth,
+                                                            ignore=self.ignore)
+            except OSError:
+                if self.backend == "inotify":
+                    raise
+        elif self.backend == "inotify":
+            raise OSError("inotify is not available here")
+        self.state = await self._scan()
+        return self.state
+
+    def close(self):
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def _events(self, timeout) -> set:
+        """wait for the inotify descriptor, then gather for the settle window"""
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self.watcher.fd, readable.set)
+        try:
+            await asyncio.wait_for(readable.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+        finally:
+            loop.remove_reader(self.watcher.fd)
+
+        dirty = set()
+        overflow = self.watcher.drain(dirty)
+        await asyncio.sleep(self.watcher.settle)
+        overflow |= self.watcher.drain(dirty)
+        return self.watcher.settled(dirty, overflow)
+
+    async def _next_changes(self, timeout):
+        """one look: (changes, replaced entries); state is updated"""
+        if self.watcher:
+            dirty = await self._events(timeout)
+            if not dirty:
+                return [], {}
+            result = await self._run(rescan_paths, self.root, self.state, dirty, self.recursive,
+                                     self.max_depth, self.algorithm, self.sample_above, self.escalate,
+                                     ignore=self.ignore)
+            if self.watcher.error is not None:
+                # out of watches: that was a full rescan, poll from here on
+                self.close()
+            return result
+
+        await asyncio.sleep(self._wait)
+        changes, before, cpu = await self._run(self._look)
+        self._wait = self.pacer.next_wait(bool(changes), cpu)
+        return changes, before
+
+    async def changes(self):
+        """async iterator of ChangeBatches, skipping quiet ticks"""
+        await self.start()
+        pending = Coalescer(self.quiet)
+        try:
+            while True:
+                changes, before = await self._next_changes(pending.timeout())
+                pending.add(changes, before)
+                if not pending.ready():
+                    continue
+                changes, before, after = pending.flush(self.state)
+                if changes:
+                    yield ChangeBatch(self.root, changes, before, after)
+        finally:
+            self.close()
+
+    def __aiter__(self):
+        return self.changes()
+
+
+async def watch(path, **options):
+    """async iterator of ChangeBatches for one tree"""
+    async for batch in AsyncWitness(path, **options):
+        yield batch
+
+
+async def watch_many(paths, **options):
+    """
+    watch several trees from one event loop; batches arrive as they
+    happen, each tagged with its root
+    """
+    queue = asyncio.Queue()
+
+    async def pump(path):
+        try:
+            async for batch in AsyncWitness(path, **options):
+                await queue.put(batch)
+        except Exception as e:
+            await queue.put(e)
+
+    tasks = [asyncio.create_task(pump(path)) for path in paths]
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def watch_value(load, interval=5.0, fingerprint=None, executor=None, pacer=None):
+    """
+    poll load() every interval (or as a pacing.Pacer says) and yield
+    (old, new) when it changes. the first value found comes out as
+    (None, value). load() returning None means "not there right now"
+    and is skipped.
+    """
+    loop = asyncio.get_running_loop()
+    fingerprint = fingerprint or repr
+    pacer = pacer or pacing.Pacer(interval)
+    value = None
+    fp = None
+
+    def look():
+        # timed on the executor's thread, so only this load is charged
+        started = time.thread_time()
+        new = load()
+        new_fp = fingerprint(new) if new is not None else None
+        return new, new_fp, time.thread_time() - started
+
+    while True:
+        new, new_fp, cpu = await loop.run_in_executor(executor, look)
+        if new is None:
+            new_fp = fp
+        changed = new_fp != fp
+        wait = pacer.next_wait(changed, cpu)
+        if changed:
+            yield value, new
+            value, fp = new, new_fp
+        await asyncio.sleep(wait)
@@ -0,0 +1,15 @@
+"""
+bench - how long witnessing takes, at scale
+
+grows reproducible synthetic trees in a temporary directory and times
+each phase of witnessing them: scanning cold and warm, saving and
+loading a scan, rescanning after churn, comparing and diffing. every
+phase reports wall and cpu time, read/write syscalls, bytes read (and
+how many came from storage) and its peak memory.
+
+    python3 -m bench                             # 10k files, text report
+    python3 -m bench --files 10k,100k,1m --json results.json
+    python3 -m bench compare before.json after.json
+
+see bench/suite.py for the phases and bench/tree.py for the trees.
+"""
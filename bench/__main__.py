@@ -0,0 +1,125 @@
+"""command line for the benchmarks: python3 -m bench [options], or python3 -m bench compare A B"""
+
+import json
+import sys
+from pathlib import Path
+
+from bench import suite, tree
+from witness import DEFAULT_ALGORITHM, HASH_ALGORITHMS, parse_size
+
+
+def print_report(report: dict):
+    build = report["build"]
+    print(f"witness bench  {build['commit'] or '(no commit)'}  python {build['python']}  "
+          f"{build['cpus']} cpus")
+    for run in report["runs"]:
+        grown = run["tree"]
+        churned = run["churn"]
+        print()
+        print(f"{grown['files']} files in {grown['dirs']} directories, {grown['bytes'] / 1e6:.1f} MB; "
+              f"churn {churned['percent']:g}%: {run['changes']} changes")
+        print(f"  {'phase':16}{'wall s':>10}{'cpu s':>10}{'reads':>10}{'MB read':>10}"
+              f"{'MB disk':>10}{'peak MB':>10}")
+        for p in run["phases"]:
+            print(f"  {p['phase']:16}{p['wall_s']:>10.3f}{p['cpu_s']:>10.3f}"
+                  f"{p.get('read_calls', 0):>10}{p.get('bytes_read', 0) / 1e6:>10.1f}"
+                  f"{p.get('storage_bytes_read', 0) / 1e6:>10.1f}{(p['peak_rss_kb'] or 0) / 1024:>10.1f}")
+
+
+def compare(old_file, new_file):
+    """wall time per phase and scale, new against old"""
+    old = json.loads(Path(old_file).read_text())
+    new = json.loads(Path(new_file).read_text())
+    print(f"{old['build']['commit']} -> {new['build']['commit']}")
+    old_runs = {run["spec"]["files"]: run for run in old["runs"]}
+    for run in new["runs"]:
+        files = run["spec"]["files"]
+        before = old_runs.get(files)
+        if before is None:
+            continue
+        old_phases = {p["phase"]: p for p in before["phases"]}
+        print()
+        print(f"{files} files")
+        for p in run["phases"]:
+            o = old_phases.get(p["phase"])
+            if o is None:
+                continue
+            ratio = p["wall_s"] / o["wall_s"] if o["wall_s"] else float("inf")
+            print(f"  {p['phase']:16}{o['wall_s']:>10.3f}{p['wall_s']:>10.3f}{ratio:>9.2f}x")
+
+
+def option(name, default=None):
+    if name in sys.argv:
+        try:
+            return sys.argv[sys.argv.index(name) + 1]
+        except IndexError:
+            pass
+    return default
+
+
+def main():
+    if "--help" in sys.argv or "-h" in sys.argv:
+        print("usage: python3 -m bench [options]")
+        print("       python3 -m bench compare OLD.json NEW.json")
+        print()
+        print("options:")
+        print("  --files N,N   tree sizes to run, e.g. 10k,100k,1m (default: 10k)")
+        print("  --depth N     directory levels (default: 4)")
+        print("  --per-dir N   files per directory (default: 20)")
+        print("  --size S      median file size, e.g. 1K (default: 1K); sizes are log-normal")
+        print("  --churn PCT   share of files changed between scans (default: 5)")
+        print("  --cache M,M   page cache states to scan in: cold, warm (default: both)")
+        print("  --seed N      tree seed (default: 1)")
+        print("  --jobs N      hash on N threads")
+        print(f"  --hash NAME   hash algorithm (default: {DEFAULT_ALGORITHM})")
+        print("  --dir DIR     where to grow the trees (default: the system temp dir)")
+        print("  --json FILE   write the results as json (- for stdout)")
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        if len(sys.argv) < 4:
+            print("need: compare OLD.json NEW.json")
+            sys.exit(1)
+        compare(sys.argv[2], sys.argv[3])
+        return
+
+    try:
+        counts = [tree.parse_count(n) for n in option("--files", "10k").split(",")]
+        depth = int(option("--depth", 4))
+        per_dir = int(option("--per-dir", 20))
+        median_size = parse_size(option("--size", "1K"))
+        churn_percent = float(option("--churn", 5))
+        seed = int(option("--seed", 1))
+        jobs = int(option("--jobs")) if option("--jobs") else None
+    except ValueError as e:
+        print(f"bad option: {e}")
+        sys.exit(1)
+
+    cache_modes = [m for m in option("--cache", "cold,warm").split(",") if m]
+    if not cache_modes or set(cache_modes) - set(suite.CACHE_MODES):
+        print(f"--cache takes {' and/or '.join(suite.CACHE_MODES)}")
+        sys.exit(1)
+    algorithm = option("--hash", DEFAULT_ALGORITHM)
+    if algorithm not in HASH_ALGORITHMS:
+        print(f"unknown hash: {algorithm} (choose from {', '.join(HASH_ALGORITHMS)})")
+        sys.exit(1)
+
+    json_file = option("--json")
+    to_stdout = json_file == "-"
+    say = (lambda *args: print(*args, file=sys.stderr)) if to_stdout else print
+
+    specs = [tree.TreeSpec(n, depth, per_dir, median_size, seed=seed) for n in counts]
+    report = suite.run(specs, option("--dir"), churn_percent, cache_modes, jobs, algorithm, say)
+
+    if to_stdout:
+        print(json.dumps(report, indent=2))
+        return
+    print_report(report)
+    if json_file:
+        Path(json_file).write_text(json.dumps(report, indent=2) + "\n")
+        print()
+        print(f"results written to {json_file}")
+
+
+if __name__ == "__main__":
+    main()
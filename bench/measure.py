@@ -0,0 +1,73 @@
+"""
+what a phase cost: wall and cpu time, i/o and peak memory
+
+i/o comes from /proc/self/io: read and write syscalls (syscr, syscw),
+bytes passed through read calls (rchar) and bytes that actually came
+from storage (read_bytes). peak memory is VmHWM from /proc/self/status,
+reset before each phase through /proc/self/clear_refs, so every phase
+reports its own peak rather than the process's. off linux, or where
+those files can't be read, the fields are left out.
+"""
+
+import resource
+import time
+
+IO_FIELDS = {
+    "syscr": "read_calls",
+    "syscw": "write_calls",
+    "rchar": "bytes_read",
+    "read_bytes": "storage_bytes_read",
+}
+
+
+def _io() -> dict:
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+    except (OSError, ValueError):
+        return {}
+    return {name: int(fields[key]) for key, name in IO_FIELDS.items() if key in fields}
+
+
+def _reset_peak() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_kb(reset: bool) -> int | None:
+    if reset:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            pass
+    # since the process started, not just this phase
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(name: str, fn, *args, **kwargs):
+    """run fn(*args, **kwargs) once; returns (its result, the phase's numbers)"""
+    reset = _reset_peak()
+    io_before = _io()
+    cpu_before = time.process_time()
+    started = time.perf_counter()
+
+    value = fn(*args, **kwargs)
+
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_before
+    io_after = _io()
+
+    numbers = {"phase": name, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6)}
+    for key in io_after:
+        if key in io_before:
+            numbers[key] = io_after[key] - io_before[key]
+    numbers["peak_rss_kb"] = _peak_kb(reset)
+    numbers["peak_is_phase"] = reset
+    return value, numbers
@@ -0,0 +1,131 @@
+"""
+the phases, run against one synthetic tree at a time
+
+    grow            write the tree
+    scan_cold       scan_directory with the tree's pages dropped
+    scan_warm       scan_directory again, everything cached
+    save_scan       save the scan as the baseline
+    load_scan       load_previous_scan
+    churn           change a share of the tree
+    rescan_cold     scan_directory against the baseline, pages dropped
+    rescan_warm     the same, cached
+    compare_states  compare_states on the two scans as dicts
+    diff_states     diff_witness.diff_states on the two scans as saved
+
+saved scans go to a store inside the work directory, never the real
+~/.witness-cache.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import diff_witness
+import scan_store
+import witness
+from bench import tree
+from bench.measure import measure
+
+CACHE_MODES = ("cold", "warm")
+
+
+def describe_build() -> dict:
+    """what's being measured, so results from two commits can be told apart"""
+    here = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=here,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+def _settle():
+    """wait out the racy window, so fresh files' stat keys can be trusted"""
+    time.sleep(witness.RACY_WINDOW_NS / 1e9 + 0.1)
+
+
+def run_scale(spec: tree.TreeSpec, workdir, churn_percent=5.0, cache_modes=CACHE_MODES,
+              jobs=None, algorithm=witness.DEFAULT_ALGORITHM, say=None) -> dict:
+    """every phase against one tree grown from spec; returns the run's record"""
+    say = say or (lambda *args: None)
+    root = Path(tempfile.mkdtemp(prefix=f"tree-{spec.files}-", dir=workdir))
+    real_store = witness.SCAN_STORE
+    witness.SCAN_STORE = scan_store.ScanStore(root.parent / f"scans-{root.name}")
+    phases = []
+    scan_options = {"jobs": jobs, "algorithm": algorithm}
+
+    def phase(name, fn, *args, **kwargs):
+        say(f"  {name}...")
+        value, numbers = measure(name, fn, *args, **kwargs)
+        phases.append(numbers)
+        return value
+
+    try:
+        grown = phase("grow", tree.grow, str(root), spec)
+        _settle()
+
+        state = None
+        for mode in cache_modes:
+            if mode == "cold":
+                tree.drop_cache(str(root))
+            state = phase(f"scan_{mode}", witness.scan_directory, root, **scan_options)
+
+        phase("save_scan", witness.save_scan, str(root), state, algorithm)
+        before = phase("load_scan", witness.load_previous_scan, str(root))
+
+        churned = phase("churn", tree.churn, str(root), spec, churn_percent)
+
+        after = None
+        for mode in cache_modes:
+            if mode == "cold":
+                tree.drop_cache(str(root))
+            after = phase(f"rescan_{mode}", witness.scan_directory, root, previous=before["state"],
+                          **scan_options)
+
+        changes = phase("compare_states", witness.compare_states, state, after)
+
+        witness.SCAN_STORE.save("bench:after", after, path=str(root), algorithm=algorithm)
+        saved_after = witness.SCAN_STORE.load("bench:after")
+        diff = phase("diff_states", diff_witness.diff_states, before, saved_after)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        shutil.rmtree(witness.SCAN_STORE.root, ignore_errors=True)
+        witness.SCAN_STORE = real_store
+
+    return {
+        "spec": spec.as_dict(),
+        "tree": grown,
+        "churn": dict(churned, percent=churn_percent),
+        "changes": len(changes),
+        "diff": {kind: len(diff[kind]) for kind in ("created", "deleted", "modified")},
+        "phases": phases,
+    }
+
+
+def run(specs, workdir=None, churn_percent=5.0, cache_modes=CACHE_MODES, jobs=None,
+        algorithm=witness.DEFAULT_ALGORITHM, say=None) -> dict:
+    """run every spec in turn; returns the whole report"""
+    say = say or (lambda *args: None)
+    report = {
+        "bench": 1,
+        "build": describe_build(),
+        "options": {"churn_percent": churn_percent, "cache": list(cache_modes), "jobs": jobs,
+                    "algorithm": algorithm},
+        "runs": [],
+    }
+    for spec in specs:
+        say(f"{spec.files} files, depth {spec.depth}, {spec.per_dir} per directory")
+        report["runs"].append(run_scale(spec, workdir, churn_percent, cache_modes, jobs, algorithm, say))
+    return report
@@ -0,0 +1,163 @@
+"""
+synthetic trees: the same seed always grows the same tree
+
+files are spread over directories `depth` levels deep, `per_dir` to a
+directory, with sizes drawn from a log-normal around `median_size` (most
+files small, a few large, as in real work trees). contents are slices of
+one seeded random block, so nothing compresses or dedupes by accident.
+
+every file's mtime is set to a fixed moment in the past, so two trees
+grown from one seed stat alike apart from their inodes and ctimes.
+"""
+
+import math
+import os
+import random
+
+BLOCK = 4 << 20
+# 2023-11-14, well outside any racy window; churned files are a day younger
+PAST_NS = 1_700_000_000_000_000_000
+DAY_NS = 86_400 * 1_000_000_000
+
+
+def parse_count(text: str) -> int:
+    """'10k', '100k', '1m', '2500' -> a count (decimal, not binary)"""
+    units = {"K": 1_000, "M": 1_000_000}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class TreeSpec:
+    """how to grow a tree"""
+
+    def __init__(self, files=10_000, depth=4, per_dir=20, median_size=1024, size_sigma=1.0,
+                 max_size=16 << 20, seed=1):
+        self.files = files
+        self.depth = depth
+        self.per_dir = per_dir
+        self.median_size = median_size
+        self.size_sigma = size_sigma
+        self.max_size = max_size
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+    def dirs(self) -> int:
+        return max(1, math.ceil(self.files / self.per_dir))
+
+    def fanout(self) -> int:
+        """children per directory, so that depth levels hold all the directories"""
+        return max(2, math.ceil(self.dirs() ** (1 / max(1, self.depth))))
+
+    def dir_path(self, index: int) -> str:
+        fanout = self.fanout()
+        parts = []
+        for _ in range(self.depth):
+            index, digit = divmod(index, fanout)
+            parts.append(f"d{digit:02d}")
+        return os.path.join(*reversed(parts))
+
+    def file_path(self, index: int) -> str:
+        return os.path.join(self.dir_path(index // self.per_dir), f"f{index:07d}.dat")
+
+
+class Content:
+    """bytes for files, cut from one seeded random block"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.block = self.rng.randbytes(BLOCK)
+
+    def take(self, size: int) -> bytes:
+        if size <= BLOCK:
+            start = self.rng.randrange(0, BLOCK - size + 1)
+            return self.block[start:start + size]
+        return (self.block * (size // BLOCK + 1))[:size]
+
+    def size(self, spec: TreeSpec) -> int:
+        size = int(self.rng.lognormvariate(math.log(spec.median_size), spec.size_sigma))
+        return min(size, spec.max_size)
+
+
+def _write(path: str, data: bytes, mtime_ns=PAST_NS):
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def grow(root: str, spec: TreeSpec) -> dict:
+    """write spec's tree under root; returns {"files", "dirs", "bytes"}"""
+    content = Content(spec.seed)
+    made = set()
+    total = 0
+    for i in range(spec.files):
+        rel = spec.file_path(i)
+        directory = os.path.dirname(rel)
+        if directory not in made:
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+            made.add(directory)
+        data = content.take(content.size(spec))
+        _write(os.path.join(root, rel), data)
+        total += len(data)
+    return {"files": spec.files, "dirs": len(made), "bytes": total}
+
+
+def churn(root: str, spec: TreeSpec, percent: float, seed=None) -> dict:
+    """
+    change percent of the tree: of the files touched, 2 in 5 are
+    rewritten in place, 1 in 5 appended to, 1 in 5 deleted, and 1 in 5
+    have a new file appear beside them. returns the counts
+    """
+    rng = random.Random(spec.seed * 7919 + 1 if seed is None else seed)
+    content = Content(rng.random())
+    touched = rng.sample(range(spec.files), min(spec.files, round(spec.files * percent / 100)))
+    counts = {"modified": 0, "appended": 0, "deleted": 0, "created": 0}
+    for n, i in enumerate(touched):
+        path = os.path.join(root, spec.file_path(i))
+        kind = n % 5
+        if kind in (0, 1):
+            size = os.path.getsize(path)
+            _write(path, content.take(max(1, size)), PAST_NS + DAY_NS)
+            counts["modified"] += 1
+        elif kind == 2:
+            with open(path, "ab") as f:
+                f.write(content.take(256))
+            os.utime(path, ns=(PAST_NS + DAY_NS, PAST_NS + DAY_NS))
+            counts["appended"] += 1
+        elif kind == 3:
+            os.remove(path)
+            counts["deleted"] += 1
+        else:
+            new = os.path.join(os.path.dirname(path), f"new{i:07d}.dat")
+            _write(new, content.take(content.size(spec)), PAST_NS + DAY_NS)
+            counts["created"] += 1
+    return counts
+
+
+def drop_cache(root: str) -> int:
+    """
+    ask the kernel to forget the tree's file pages (posix_fadvise
+    DONTNEED, no root needed); returns how many files were dropped.
+    directory and inode caches stay warm: only root can drop those
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return 0
+    dropped = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            try:
+                fd = os.open(os.path.join(dirpath, name), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                dropped += 1
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+    return dropped
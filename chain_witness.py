@@ -6,13 +6,16 @@ observes iteration changes, completed tasks, ideas queue
 reports when the chain moves forward
 """
 
+import asyncio
 import json
 import sys
-import time
 import hashlib
 from datetime import datetime
 from pathlib import Path
 
+import pacing
+from async_witness import watch_value
+
 # Singleton protection
 sys.path.insert(0, str(Path.home() / "workspace" / "organism"))
 try:
@@ -28,7 +31,7 @@ LOG_FILE = HOME / ".infinite-chain" / ".chain-witness.log"
 
 def fingerprint(data: dict) -> str:
     """hash of state for change detection"""
-    return hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+    return hashlib.blake2b(json.dumps(data, sort_keys=True).encode(), digest_size=16).hexdigest()
 
 
 def load_state() -> dict | None:
@@ -100,8 +103,9 @@ def watch_once():
     print(f"  fingerprint: {fingerprint(state)}")
 
 
-def watch_loop(interval: float = 5.0):
+def watch_loop(interval: float = 5.0, pacer: pacing.Pacer = None):
     """continuously watch for chain changes"""
+    pacer = pacer or pacing.Pacer(interval)
     # Singleton protection
     guard = None
     if HAS_SINGLETON:
@@ -112,42 +116,18 @@ def watch_loop(interval: float = 5.0):
 
     print("chain_witness begins watching")
     print(f"target: {STATE_FILE}")
-    print(f"interval: {interval}s")
+    print(f"interval: {pacing.describe(pacer)}")
     if guard:
         print("singleton: protected")
     print()
 
     log_observation("chain_witness begins")
 
-    state = load_state()
-    if state is None:
+    if load_state() is None:
         print("chain state not found, waiting...")
-        while state is None:
-            time.sleep(interval)
-            state = load_state()
-
-    fp = fingerprint(state)
-    log_observation(f"initial state: iteration={state.get('iteration')}, streak={state.get('streak', {}).get('iterations')}")
 
     try:
-        while True:
-            time.sleep(interval)
-            new_state = load_state()
-
-            if new_state is None:
-                continue
-
-            new_fp = fingerprint(new_state)
-
-            if new_fp != fp:
-                changes = describe_change(state, new_state)
-                log_observation("chain moved:")
-                for change in changes:
-                    log_observation(f"  {change}")
-
-                state = new_state
-                fp = new_fp
-
+        asyncio.run(observe_chain(pacer))
     except KeyboardInterrupt:
         print()
         log_observation("chain_witness stops")
@@ -158,6 +138,19 @@ def watch_loop(interval: float = 5.0):
             guard.release()
 
 
+async def observe_chain(pacer: pacing.Pacer):
+    """log the chain's movement; runs until cancelled"""
+    async for old, new in watch_value(load_state, pacer.base, fingerprint, pacer=pacer):
+        if old is None:
+            log_observation(f"initial state: iteration={new.get('iteration')}, streak={new.get('streak', {}).get('iterations')}")
+            continue
+
+        changes = describe_change(old, new)
+        log_observation("chain moved:")
+        for change in changes:
+            log_observation(f"  {change}")
+
+
 def show_history():
     """show observation history"""
     if not LOG_FILE.exists():
@@ -177,8 +170,13 @@ def main():
     cmd = sys.argv[1]
 
     if cmd == "--loop":
-        interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
-        watch_loop(interval)
+        interval = 5.0
+        if len(sys.argv) > 2:
+            try:
+                interval = float(sys.argv[2])
+            except ValueError:
+                pass
+        watch_loop(interval, pacing.from_argv(sys.argv, interval))
 
     elif cmd == "--history":
         show_history()
@@ -189,6 +187,7 @@ def main():
         print("usage:")
         print("  chain_witness.py           # observe once")
         print("  chain_witness.py --loop    # continuous watching")
+        print("      [interval] [--max-interval N] [--cpu-budget PCT]")
         print("  chain_witness.py --history # show log")
 
 
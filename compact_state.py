@@ -0,0 +1,332 @@
+"""
+compact_state - scan state without a dict per file
+
+a state is mostly numbers and hashes, but as a dict of dicts every file
+costs a key string, an entry dict, a float, ints, a hex string and a
+stat list: several hundred bytes. here the same state lives in columns:
+
+    mtime_ns, size, ino, ctime_ns   array('q'/'Q')
+    device                          index into a small table
+    flags                           has hash, has stat key, sampled
+    hash                            fixed-width digests in one bytearray
+    path                            directory id + name bytes
+
+and a path -> row index in an open-addressing array. directories are
+ids in a path_table.PathTable, so a prefix is stored once per directory
+rather than once per file, and under() finds a subtree without looking
+at the paths of anything outside it. entries go in and
+come out as the usual dicts, so CompactState stands in wherever a state
+dict does. entries that don't fit the columns (a stat key that doesn't
+match mtime, a sample, an odd hash width) are kept as they are, aside.
+
+deleted rows are reused; the name bytes they leave behind are reclaimed
+when they outgrow the live ones, and the directory table is rebuilt
+then too, dropping directories no live row is in.
+"""
+
+import os
+from array import array
+from collections.abc import MutableMapping
+
+from path_table import ROOT, PathTable
+
+HAS_HASH = 1
+HAS_STAT = 2
+SAMPLED = 4
+ODD = 8
+DEAD = 16
+
+EMPTY = -1
+REMOVED = -2
+
+
+def _mtime(mtime_ns: int) -> float:
+    """st_mtime as os.stat computes it from the nanoseconds"""
+    sec, nsec = divmod(mtime_ns, 1_000_000_000)
+    return sec + nsec * 1e-9
+
+
+class CompactState(MutableMapping):
+    """a scan state (path -> entry dict) stored in columns"""
+
+    def __init__(self, items=None):
+        self._mtime_ns = array("q")
+        self._size = array("Q")
+        self._ino = array("Q")
+        self._ctime_ns = array("q")
+        self._dev = array("H")
+        self._flags = array("B")
+        self._hashes = bytearray()
+        self._width = None
+
+        self._dir = array("I")
+        self._name_at = array("I")
+        self._name_len = array("H")
+        self._names = bytearray()
+        self._garbage = 0
+
+        self._table = PathTable()
+        self._devs = []
+        self._dev_ids = {}
+        self._odd = {}
+
+        self._free = []
+        self._count = 0
+        # slots that aren't EMPTY: live rows and REMOVED markers
+        self._used = 0
+        self._slots = array("i", [EMPTY]) * 8
+        # rows read or set since track(), by row number
+        self._touched = None
+
+        if items:
+            self.update(items)
+
+    # paths
+
+    def _path(self, row: int) -> str:
+        start = self._name_at[row]
+        name = os.fsdecode(bytes(self._names[start:start + self._name_len[row]]))
+        directory = self._table.path(self._dir[row])
+        return directory + os.sep + name if directory else name
+
+    def _find(self, path: str) -> tuple[int, int]:
+        """(slot, row) for path; row is -1 and slot the first free slot if absent"""
+        directory, _, name = path.rpartition(os.sep)
+        dir_id = self._table.find(directory)
+        raw = os.fsencode(name)
+        mask = len(self._slots) - 1
+        slot = hash(path) & mask
+        free = -1
+        while True:
+            row = self._slots[slot]
+            if row == EMPTY:
+                return (free if free >= 0 else slot), -1
+            if row == REMOVED:
+                if free < 0:
+                    free = slot
+            elif self._dir[row] == dir_id and self._name_len[row] == len(raw):
+                start = self._name_at[row]
+                if self._names[start:start + len(raw)] == raw:
+                    return slot, row
+            slot = (slot + 1) & mask
+
+    def _rehash(self):
+        """rebuild the index, doubling it if live rows need the room"""
+        size = len(self._slots)
+        while self._count * 2 >= size:
+            size *= 2
+        slots = array("i", [EMPTY]) * size
+        mask = len(slots) - 1
+        for row in range(len(self._flags)):
+            if self._flags[row] & DEAD:
+                continue
+            slot = hash(self._path(row)) & mask
+            while slots[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            slots[slot] = row
+        self._slots = slots
+        self._used = self._count
+
+    # entries
+
+    def _fits(self, entry: dict) -> bool:
+        stat = entry.get("stat")
+        digest = entry.get("hash")
+        return (
+            stat is not None
+            and not entry.keys() - {"mtime", "size", "hash", "stat", "sampled"}
+            and stat[2] == entry.get("size")
+            and _mtime(stat[3]) == entry.get("mtime")
+            and 0 <= stat[1] and len(self._devs) < 0xFFFF
+            and (digest is None or self._width is None or len(digest) == 2 * self._width)
+        )
+
+    def _write(self, row: int, entry: dict):
+        if not self._fits(entry):
+            self._flags[row] = ODD
+            self._odd[row] = entry
+            return
+        self._odd.pop(row, None)
+
+        ino, dev, size, mtime_ns, ctime_ns = entry["stat"]
+        dev_id = self._dev_ids.get(dev)
+        if dev_id is None:
+            dev_id = self._dev_ids[dev] = len(self._devs)
+            self._devs.append(dev)
+
+        flags = HAS_STAT
+        digest = entry.get("hash")
+        if digest is not None:
+            flags |= HAS_HASH
+            raw = bytes.fromhex(digest)
+            if self._width is None:
+                self._width = len(raw)
+                self._hashes = bytearray(self._width * len(self._flags))
+            at = row * self._width
+            self._hashes[at:at + self._width] = raw
+        if entry.get("sampled"):
+            flags |= SAMPLED
+
+        self._mtime_ns[row] = mtime_ns
+        self._size[row] = size
+        self._ino[row] = ino
+        self._ctime_ns[row] = ctime_ns
+        self._dev[row] = dev_id
+        self._flags[row] = flags
+
+    def _read(self, row: int) -> dict:
+        flags = self._flags[row]
+        if flags & ODD:
+            return self._odd[row]
+        size = self._size[row]
+        mtime_ns = self._mtime_ns[row]
+        digest = None
+        if flags & HAS_HASH:
+            at = row * self._width
+            digest = self._hashes[at:at + self._width].hex()
+        entry = {"mtime": _mtime(mtime_ns), "size": size, "hash": digest}
+        if flags & SAMPLED:
+            entry["sampled"] = True
+        entry["stat"] = [self._ino[row], self._devs[self._dev[row]], size, mtime_ns, self._ctime_ns[row]]
+        return entry
+
+    def _new_row(self, path: str) -> int:
+        directory, _, name = path.rpartition(os.sep)
+        raw = os.fsencode(name)
+        if self._free:
+            row = self._free.pop()
+            # its old name bytes stay behind as garbage until the next compaction
+            self._flags[row] = 0
+            self._dir[row] = self._table.intern(directory)
+            self._name_at[row] = len(self._names)
+            self._name_len[row] = len(raw)
+        else:
+            row = len(self._flags)
+            for column in (self._mtime_ns, self._size, self._ino, self._ctime_ns,
+                           self._dev, self._flags):
+                column.append(0)
+            if self._width:
+                self._hashes.extend(bytes(self._width))
+            self._dir.append(self._table.intern(directory))
+            self._name_at.append(len(self._names))
+            self._name_len.append(len(raw))
+        self._names += raw
+        return row
+
+    # mapping
+
+    def __getitem__(self, path):
+        _, row = self._find(path)
+        if row < 0:
+            raise KeyError(path)
+        if self._touched is not None:
+            self._touch(row)
+        return self._read(row)
+
+    def __contains__(self, path):
+        return self._find(path)[1] >= 0
+
+    def __setitem__(self, path, entry):
+        slot, row = self._find(path)
+        if row < 0:
+            row = self._new_row(path)
+            if self._slots[slot] == EMPTY:
+                self._used += 1
+            self._slots[slot] = row
+            self._count += 1
+            if self._used * 2 > len(self._slots):
+                self._rehash()
+        self._write(row, entry)
+        if self._touched is not None:
+            self._touch(row)
+
+    def __delitem__(self, path):
+        slot, row = self._find(path)
+        if row < 0:
+            raise KeyError(path)
+        self._slots[slot] = REMOVED
+        self._flags[row] = DEAD
+        self._odd.pop(row, None)
+        self._free.append(row)
+        self._garbage += self._name_len[row]
+        self._count -= 1
+        if self._garbage > len(self._names) // 2 > 4096:
+            self._compact_names()
+
+    def _compact_names(self):
+        names = bytearray()
+        for row in range(len(self._flags)):
+            start = self._name_at[row]
+            length = self._name_len[row] if not self._flags[row] & DEAD else 0
+            self._name_at[row] = len(names)
+            self._name_len[row] = length
+            names += self._names[start:start + length]
+        self._names = names
+        self._garbage = 0
+
+        live = {self._dir[row] for row in self._rows()}
+        self._table, remap = self._table.compacted(live)
+        for row in range(len(self._dir)):
+            self._dir[row] = remap.get(self._dir[row], ROOT)
+
+    def __len__(self):
+        return self._count
+
+    def _rows(self):
+        return (row for row in range(len(self._flags)) if not self._flags[row] & DEAD)
+
+    def __iter__(self):
+        for row in self._rows():
+            yield self._path(row)
+
+    def items(self):
+        for row in self._rows():
+            yield self._path(row), self._read(row)
+
+    def values(self):
+        for row in self._rows():
+            yield self._read(row)
+
+    def sorted_items(self, key):
+        """(path, entry) ordered by key(path), decoding one entry at a time"""
+        order = sorted(self._rows(), key=lambda row: key(self._path(row)))
+        for row in order:
+            yield self._path(row), self._read(row)
+
+    def under(self, prefix: str):
+        """(path, entry) for prefix itself and everything below it"""
+        prefix = prefix.rstrip(os.sep)
+        if prefix in self:
+            yield prefix, self[prefix]
+        node = self._table.find(prefix)
+        if node is None:
+            return
+        inside = self._table.subtree(node)
+        flags = self._flags
+        for row, dir_id in enumerate(self._dir):
+            if dir_id in inside and not flags[row] & DEAD:
+                yield self._path(row), self._read(row)
+
+    def _touch(self, row: int):
+        if row >= len(self._touched):
+            self._touched.extend(bytes(row + 1 - len(self._touched)))
+        self._touched[row] = 1
+
+    def track(self):
+        """start noting which paths are read or set, for untouched()"""
+        self._touched = bytearray(len(self._flags))
+
+    def untouched(self) -> list:
+        """the paths neither read nor set since track(); tracking stops"""
+        touched, self._touched = self._touched, None
+        return [self._path(row) for row in self._rows() if row >= len(touched) or not touched[row]]
+
+    def clear(self):
+        self.__init__()
+
+    def nbytes(self) -> int:
+        """memory held by the columns, names and index"""
+        columns = (self._mtime_ns, self._size, self._ino, self._ctime_ns, self._dev, self._flags,
+                   self._dir, self._name_at, self._name_len, self._slots)
+        return (sum(c.itemsize * len(c) for c in columns) + len(self._hashes) + len(self._names)
+                + self._table.nbytes())
@@ -12,52 +12,90 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+import ignore_rules
+import merkle
+import scan_store
+import sinks
+from ignore_rules import IgnoreRules
+
 # import witness functions
 try:
-    from witness import scan_directory, compare_states, hash_file
+    from witness import scan_directory, compare_states, hash_file, DEFAULT_ALGORITHM, LEGACY_ALGORITHM
 except ImportError:
     # fallback - define locally
     import hashlib
 
+    DEFAULT_ALGORITHM = "md5"
+    LEGACY_ALGORITHM = "md5-8"
+
     def hash_file(filepath: Path) -> str:
         try:
+            h = hashlib.md5()
+            buf = bytearray(1 << 20)
+            view = memoryview(buf)
             with open(filepath, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
+                while n := f.readinto(buf):
+                    h.update(view[:n])
+            return h.hexdigest()
         except:
             return "error"
 
-    def scan_directory(path: Path) -> dict:
+    def scan_directory(path: Path, jobs: int = None, ignore=None) -> dict:
+        # no thread pool in the fallback; jobs is accepted and ignored
         state = {}
         for item in path.rglob('*'):
             if item.is_file() and '.git' not in str(item):
+                rel = str(item.relative_to(path))
+                if ignore is not None and ignore.excluded(rel, False):
+                    continue
                 try:
-                    state[str(item.relative_to(path))] = hash_file(item)
+                    state[rel] = hash_file(item)
                 except:
                     pass
         return state
 
 
 WITNESS_CACHE = Path.home() / ".witness-cache"
+# shared with witness --diff, which keeps its per-path baselines here too
+STORE = scan_store.ScanStore(WITNESS_CACHE / "scans")
 
 
-def save_state(name: str, state: dict, path: str):
+def save_state(name: str, state: dict, path: str, algorithm: str = DEFAULT_ALGORITHM):
     """save a witness state"""
     WITNESS_CACHE.mkdir(exist_ok=True)
+    timestamp = datetime.now().isoformat()
+    legacy = WITNESS_CACHE / f"{name}.json"
+
+    # the packed store needs witness-style entries; the fallback scanner
+    # only produces bare hashes, so those stay in json
+    if all(isinstance(entry, dict) for entry in state.values()):
+        filepath = STORE.save(
+            f"name:{name}", state,
+            name=name, timestamp=timestamp, path=str(path), algorithm=algorithm,
+        )
+        if legacy.exists():
+            legacy.unlink()
+        return filepath
 
     data = {
         "name": name,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": timestamp,
         "path": str(path),
+        "algorithm": algorithm,
         "state": state,
     }
 
-    filepath = WITNESS_CACHE / f"{name}.json"
-    filepath.write_text(json.dumps(data, indent=2))
-    return filepath
+    legacy.write_text(json.dumps(data, indent=2))
+    STORE.remove(f"name:{name}")
+    return legacy
 
 
 def load_state(name: str) -> dict | None:
     """load a saved witness state"""
+    data = STORE.load(f"name:{name}")
+    if data:
+        return data
+
     filepath = WITNESS_CACHE / f"{name}.json"
     if filepath.exists():
         try:
@@ -73,9 +111,21 @@ def list_saved_states() -> list:
         return []
 
     states = []
+    for meta in STORE.entries("name:"):
+        states.append({
+            "name": meta.get("name"),
+            "timestamp": meta.get("timestamp"),
+            "path": meta.get("path"),
+            "files": meta.get("files", 0),
+            "root": meta.get("root"),
+        })
+
     for f in WITNESS_CACHE.glob("*.json"):
         try:
             data = json.loads(f.read_text())
+            # older versions kept blame.json here, beside the states
+            if not isinstance(data, dict) or "state" not in data:
+                continue
             states.append({
                 "name": f.stem,
                 "timestamp": data.get("timestamp"),
@@ -88,38 +138,83 @@ def list_saved_states() -> list:
     return sorted(states, key=lambda x: x.get("timestamp", ""))
 
 
-def diff_states(state1: dict, state2: dict) -> dict:
-    """compute the difference between two states"""
+def _without_hash(entry):
+    """what's left to compare when the hashes aren't comparable"""
+    if isinstance(entry, dict):
+        return {k: v for k, v in entry.items() if k in ("size", "mtime")}
+    return entry
+
+
+def _differs(entry1, entry2, same_algorithm: bool) -> bool:
+    if not same_algorithm:
+        return _without_hash(entry1) != _without_hash(entry2)
+    if isinstance(entry1, dict) and isinstance(entry2, dict):
+        return not merkle.same_leaf(entry1, entry2)
+    return entry1 != entry2
+
+
+def diff_states(state1: dict, state2: dict, under: str = None) -> dict:
+    """
+    compute the difference between two states
+
+    two saved scans hashed alike are compared by their directory
+    rollups, looking only inside directories that differ. states hashed
+    with different algorithms fall back to comparing size and mtime.
+    under limits the diff to one file or directory
+    """
     s1 = state1.get("state", {})
     s2 = state2.get("state", {})
+    if under:
+        s1 = dict(scan_store.subtree(s1, under))
+        s2 = dict(scan_store.subtree(s2, under))
 
-    files1 = set(s1.keys())
-    files2 = set(s2.keys())
-
-    created = files2 - files1
-    deleted = files1 - files2
-    common = files1 & files2
+    same_algorithm = (
+        state1.get("algorithm", LEGACY_ALGORITHM) == state2.get("algorithm", LEGACY_ALGORITHM)
+    )
 
+    created = []
+    deleted = []
     modified = []
-    for f in common:
-        if s1[f] != s2[f]:
-            modified.append(f)
+
+    if same_algorithm and merkle.comparable(s1, s2):
+        for f, entry1, entry2 in merkle.pruned_pairs(s1, s2):
+            if entry1 is None:
+                created.append(f)
+            elif entry2 is None:
+                deleted.append(f)
+            elif _differs(entry1, entry2, same_algorithm):
+                modified.append(f)
+    else:
+        # packed states decode lazily; one pass each beats a lookup per file
+        if not isinstance(s1, dict):
+            s1 = dict(s1.items())
+        if not isinstance(s2, dict):
+            s2 = dict(s2.items())
+
+        files1 = set(s1.keys())
+        files2 = set(s2.keys())
+        created = list(files2 - files1)
+        deleted = list(files1 - files2)
+        modified = [f for f in files1 & files2 if _differs(s1[f], s2[f], same_algorithm)]
 
     return {
         "state1": {
             "name": state1.get("name"),
             "timestamp": state1.get("timestamp"),
             "files": len(s1),
+            "root": state1.get("root"),
         },
         "state2": {
             "name": state2.get("name"),
             "timestamp": state2.get("timestamp"),
             "files": len(s2),
+            "root": state2.get("root"),
         },
-        "created": list(created),
-        "deleted": list(deleted),
+        "under": under,
+        "created": created,
+        "deleted": deleted,
         "modified": modified,
-        "unchanged": len(common) - len(modified),
+        "unchanged": len(s2) - len(created) - len(modified),
     }
 
 
@@ -134,10 +229,13 @@ def print_diff(diff: dict):
     s2 = diff["state2"]
 
     print(f"FROM: {s1['name']} ({s1['timestamp']})")
-    print(f"  {s1['files']} files")
+    print(f"  {s1['files']} files" + (f", root {s1['root']}" if s1.get('root') else ""))
     print()
     print(f"TO: {s2['name']} ({s2['timestamp']})")
-    print(f"  {s2['files']} files")
+    print(f"  {s2['files']} files" + (f", root {s2['root']}" if s2.get('root') else ""))
+    if diff.get("under"):
+        print()
+        print(f"UNDER: {diff['under']}")
     print()
 
     print("-" * 40)
@@ -174,10 +272,27 @@ def print_diff(diff: dict):
     print(f"SUMMARY: {len(created)} created, {len(deleted)} deleted, {len(modified)} modified, {diff['unchanged']} unchanged")
 
 
-def witness_and_save(path: str, name: str):
+def emit_diff(diff: dict, state1: dict, state2: dict, sink) -> None:
+    """send a diff through an output sink, one event per change"""
+    s1 = state1.get("state", {})
+    s2 = state2.get("state", {})
+
+    def entry(state, f):
+        value = state.get(f)
+        # the fallback scanner stores a bare hash per file
+        return value if isinstance(value, dict) or value is None else {"hash": value}
+
+    sink.begin()
+    for change_type in ("created", "deleted", "modified"):
+        for f in sorted(diff[change_type]):
+            sink.emit((change_type, f), entry(s1, f), entry(s2, f))
+    sink.end()
+
+
+def witness_and_save(path: str, name: str, jobs: int = None, ignore=None):
     """scan a directory and save the state"""
     print(f"scanning {path}...")
-    state = scan_directory(Path(path))
+    state = scan_directory(Path(path), jobs=jobs, ignore=ignore)
     filepath = save_state(name, state, path)
     print(f"saved as: {name} ({len(state)} files)")
     print(f"stored at: {filepath}")
@@ -193,6 +308,13 @@ def main():
         print("  diff_witness.py diff <name1> <name2> # diff two states")
         print("  diff_witness.py quick <path>        # scan, save as 'now', diff with 'prev'")
         print()
+        print("options:")
+        print("  --jobs N    hash files on N threads (scan, quick)")
+        print("  --format F  diff output: text, jsonl, or packed (msgpack)")
+        print("  --under P   only diff P and what's below it (diff)")
+        print("  --ignore P  skip paths matching a gitignore pattern, repeatable (scan, quick)")
+        print("  --gitignore honor .gitignore files as well as .witnessignore (scan, quick)")
+        print()
         print("example workflow:")
         print("  diff_witness.py scan ~/workspace before")
         print("  # ... make changes ...")
@@ -200,6 +322,22 @@ def main():
         print("  diff_witness.py diff before after")
         return
 
+    jobs = None
+    if "--jobs" in sys.argv:
+        try:
+            idx = sys.argv.index("--jobs")
+            jobs = int(sys.argv[idx + 1])
+            del sys.argv[idx:idx + 2]
+        except (IndexError, ValueError):
+            pass
+
+    fmt = sinks.parse_format(sys.argv)
+    if "--format" in sys.argv:
+        idx = sys.argv.index("--format")
+        del sys.argv[idx:idx + 2]
+
+    ignore_options = ignore_rules.options_from_argv(sys.argv, remove=True)
+
     cmd = sys.argv[1]
 
     if cmd == "scan":
@@ -208,7 +346,7 @@ def main():
             return
         path = sys.argv[2]
         name = sys.argv[3]
-        witness_and_save(path, name)
+        witness_and_save(path, name, jobs=jobs, ignore=IgnoreRules(path, **ignore_options))
 
     elif cmd == "list":
         states = list_saved_states()
@@ -218,7 +356,8 @@ def main():
 
         print(f"saved states ({len(states)}):")
         for s in states:
-            print(f"  {s['name']:15} {s['timestamp'][:19]}  {s['files']:4} files  {s['path']}")
+            root = f"  root {s['root'][:12]}" if s.get('root') else ""
+            print(f"  {s['name']:15} {s['timestamp'][:19]}  {s['files']:4} files{root}  {s['path']}")
 
     elif cmd == "diff":
         if len(sys.argv) < 4:
@@ -238,8 +377,18 @@ def main():
             print(f"state not found: {name2}")
             return
 
-        diff = diff_states(state1, state2)
-        print_diff(diff)
+        under = None
+        if "--under" in sys.argv:
+            try:
+                under = sys.argv[sys.argv.index("--under") + 1]
+            except IndexError:
+                pass
+
+        diff = diff_states(state1, state2, under)
+        if fmt == "text":
+            print_diff(diff)
+        else:
+            emit_diff(diff, state1, state2, sinks.make_sink(fmt))
 
     elif cmd == "quick":
         # quick diff: save current as 'now', rename previous 'now' to 'prev', diff
@@ -250,13 +399,14 @@ def main():
 
         # scan and save as 'now'
         print(f"scanning {path}...")
-        state = scan_directory(Path(path))
+        state = scan_directory(Path(path), jobs=jobs, ignore=IgnoreRules(path, **ignore_options))
         save_state("now", state, path)
         print(f"saved as 'now' ({len(state)} files)")
 
         if prev_now:
             # save previous as 'prev'
-            save_state("prev", prev_now.get("state", {}), prev_now.get("path", ""))
+            save_state("prev", prev_now.get("state", {}), prev_now.get("path", ""),
+                       prev_now.get("algorithm", LEGACY_ALGORITHM))
             print("previous 'now' saved as 'prev'")
             print()
 
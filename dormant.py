@@ -18,6 +18,10 @@ import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import ignore_rules
+import pacing
+from witness import walk_files
+
 # Singleton protection
 sys.path.insert(0, str(Path.home() / "workspace" / "organism"))
 try:
@@ -29,6 +33,10 @@ except ImportError:
 HOME = Path.home()
 WORKSPACE = HOME / "workspace"
 
+# how each project's ignore rules are built (see ignore_rules.IgnoreRules);
+# main() fills this in from --gitignore and --ignore
+IGNORE_OPTIONS = {}
+
 
 def file_age(filepath: Path) -> timedelta | None:
     """get the age of a file since last modification"""
@@ -53,15 +61,20 @@ def format_age(age: timedelta) -> str:
         return f"{total_seconds / 86400:.1f} days"
 
 
+def python_files(directory: Path):
+    """the .py files in a project, minus hidden and ignored paths"""
+    ignore = ignore_rules.IgnoreRules(directory, **IGNORE_OPTIONS)
+    for rel_path, full_path, st in walk_files(directory, ignore=ignore):
+        if rel_path.endswith(".py"):
+            yield Path(full_path)
+
+
 def find_dormant_files(directory: Path, threshold_hours: float = 24.0) -> list:
     """find files older than threshold"""
     threshold = timedelta(hours=threshold_hours)
     dormant = []
 
-    for py_file in directory.rglob("*.py"):
-        if ".git" in str(py_file):
-            continue
-
+    for py_file in python_files(directory):
         age = file_age(py_file)
         if age and age > threshold:
             dormant.append({
@@ -92,10 +105,7 @@ def project_last_activity(project_dir: Path) -> timedelta | None:
     """get the most recent file modification in a project"""
     newest = None
 
-    for py_file in project_dir.rglob("*.py"):
-        if ".git" in str(py_file):
-            continue
-
+    for py_file in python_files(project_dir):
         age = file_age(py_file)
         if age is not None:
             if newest is None or age < newest:
@@ -183,8 +193,9 @@ def print_activity_report():
             print(f"  - {p['name']}")
 
 
-def watch_for_dormancy(threshold_hours: float = 1.0, interval: float = 60.0):
+def watch_for_dormancy(threshold_hours: float = 1.0, interval: float = 60.0, pacer: pacing.Pacer = None):
     """continuously watch for files becoming dormant"""
+    pacer = pacer or pacing.Pacer(interval)
     # Singleton protection
     guard = None
     if HAS_SINGLETON:
@@ -194,7 +205,7 @@ def watch_for_dormancy(threshold_hours: float = 1.0, interval: float = 60.0):
             return
 
     print(f"Watching for files dormant > {threshold_hours} hours")
-    print(f"Checking every {interval} seconds")
+    print(f"Checking every {pacing.describe(pacer)}")
     if guard:
         print("singleton: protected")
     print("Press Ctrl+C to stop")
@@ -204,6 +215,7 @@ def watch_for_dormancy(threshold_hours: float = 1.0, interval: float = 60.0):
 
     try:
         while True:
+            started = time.process_time()
             all_dormant = find_dormant_projects(threshold_hours)
             current_dormant = set()
 
@@ -221,8 +233,9 @@ def watch_for_dormancy(threshold_hours: float = 1.0, interval: float = 60.0):
                     print(f"  {Path(path).relative_to(WORKSPACE)}")
                 print()
 
+            changed = current_dormant != previous_dormant
             previous_dormant = current_dormant
-            time.sleep(interval)
+            pacer.sleep(changed, time.process_time() - started)
 
     except KeyboardInterrupt:
         print("\nWatching stopped.")
@@ -232,6 +245,7 @@ def watch_for_dormancy(threshold_hours: float = 1.0, interval: float = 60.0):
 
 
 def main():
+    IGNORE_OPTIONS.update(ignore_rules.options_from_argv(sys.argv, remove=True))
     if len(sys.argv) < 2:
         print_dormant_report()
         print()
@@ -248,7 +262,11 @@ def main():
         print("  dormant.py --hours N          # use N hour threshold")
         print("  dormant.py --activity         # rank projects by activity")
         print("  dormant.py --watch [hours]    # watch for dormancy")
+        print("      [--max-interval N] [--cpu-budget PCT]")
         print("  dormant.py --json             # JSON output")
+        print()
+        print("  --ignore PAT   skip paths matching a gitignore pattern (repeatable)")
+        print("  --gitignore    honor .gitignore files too (.witnessignore always is)")
         return
 
     elif cmd == "--hours":
@@ -259,8 +277,14 @@ def main():
         print_activity_report()
 
     elif cmd == "--watch":
-        hours = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
-        watch_for_dormancy(hours)
+        hours = 1.0
+        if len(sys.argv) > 2:
+            try:
+                hours = float(sys.argv[2])
+            except ValueError:
+                pass
+        interval = 60.0
+        watch_for_dormancy(hours, interval, pacing.from_argv(sys.argv, interval))
 
     elif cmd == "--json":
         import json
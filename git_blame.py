@@ -0,0 +1,202 @@
+"""
+git_blame - who touched it last, asked once
+
+finding the repository is a walk up the tree, done once per directory.
+HEAD is asked for once per repository. blames run a few at a time,
+and each answer is remembered by (HEAD, path, blob id): as long as
+neither the file's bytes, its place nor the history move, git is never
+asked again. (blame follows the path's history, so two files with the
+same bytes don't share an answer.)
+
+git has no batch mode for blame, so this is a small pool of
+`git blame --porcelain` runs rather than one long-lived process;
+porcelain prints each commit's details once, which is all we keep.
+"""
+
+import json
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from git_index import blob_id
+
+# in a directory of its own: top-level json in .witness-cache are saved states
+CACHE_FILE = Path.home() / ".witness-cache" / "blame" / "cache.json"
+CACHE_LIMIT = 2000
+BLAME_JOBS = 4
+
+_lock = threading.Lock()
+_roots = {}
+_heads = {}
+_cache = None
+
+
+def find_git_root(directory: Path) -> Path | None:
+    """nearest enclosing directory with a .git, cached along the way"""
+    directory = Path(directory)
+    visited = []
+    current = directory
+    root = None
+    while True:
+        with _lock:
+            if current in _roots:
+                root = _roots[current]
+                break
+        visited.append(current)
+        if (current / ".git").exists():
+            root = current
+            break
+        if current.parent == current:
+            break
+        current = current.parent
+
+    with _lock:
+        for d in visited:
+            _roots[d] = root
+    return root
+
+
+def git_head(root: Path) -> str | None:
+    """HEAD of a repository, asked once per process"""
+    with _lock:
+        if root in _heads:
+            return _heads[root]
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+        head = result.stdout.strip() if result.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        head = None
+    with _lock:
+        _heads[root] = head
+    return head
+
+
+def _load_cache() -> dict:
+    global _cache
+    with _lock:
+        if _cache is None:
+            try:
+                _cache = json.loads(CACHE_FILE.read_text())
+            except (OSError, ValueError):
+                _cache = {}
+        return _cache
+
+
+def save_cache():
+    """write remembered blames back, keeping only the newest CACHE_LIMIT"""
+    with _lock:
+        if _cache is None:
+            return
+        items = list(_cache.items())[-CACHE_LIMIT:]
+    try:
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        CACHE_FILE.write_text(json.dumps(dict(items)))
+    except OSError:
+        pass
+
+
+def _parse_porcelain(output: str) -> list:
+    """one entry per commit: author, time, summary"""
+    commits = {}
+    current = None
+    expect_header = True
+    for line in output.split("\n"):
+        if expect_header:
+            if not line:
+                continue
+            sha = line.split(" ", 1)[0]
+            current = commits.setdefault(sha, {})
+            expect_header = False
+        elif line.startswith("\t"):
+            expect_header = True
+        elif line.startswith("author "):
+            current["author"] = line[7:]
+        elif line.startswith("author-time "):
+            current["time"] = int(line[12:])
+        elif line.startswith("summary "):
+            current["summary"] = line[8:][:40]
+    return [c for c in commits.values() if c]
+
+
+def _run_blame(root: Path, rel_path: Path) -> list | None:
+    try:
+        result = subprocess.run(
+            ["git", "blame", "--porcelain", str(rel_path)],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return _parse_porcelain(result.stdout)
+
+
+def _newest(entries: list, lines: int) -> list | None:
+    """most recent distinct (author, summary) pairs, with datetimes"""
+    if not entries:
+        return None
+    entries = sorted(entries, key=lambda x: x.get("time", 0), reverse=True)
+    seen = set()
+    unique = []
+    for entry in entries:
+        key = (entry.get("author"), entry.get("summary"))
+        if key in seen:
+            continue
+        seen.add(key)
+        entry = dict(entry)
+        if "time" in entry:
+            entry["time"] = datetime.fromtimestamp(entry["time"])
+        unique.append(entry)
+        if len(unique) >= lines:
+            break
+    return unique
+
+
+def blame(filepath: Path, lines: int = 3) -> list | None:
+    """recent blame entries for one file, from cache when we can"""
+    filepath = Path(filepath)
+    root = find_git_root(filepath.parent)
+    if root is None:
+        return None
+    head = git_head(root)
+    blob = blob_id(filepath)
+    if head is None or blob is None:
+        return None
+
+    try:
+        rel_path = filepath.relative_to(root)
+    except ValueError:
+        return None
+    key = f"{head}:{rel_path.as_posix()}:{blob}"
+    cache = _load_cache()
+    with _lock:
+        entries = cache.get(key)
+
+    if entries is None:
+        entries = _run_blame(root, rel_path)
+        if entries is None:
+            return None
+        with _lock:
+            cache[key] = entries
+
+    return _newest(entries, lines)
+
+
+def blame_many(filepaths: list, lines: int = 3, jobs: int = BLAME_JOBS) -> dict:
+    """blame several files at once, on a small pool; path -> entries"""
+    filepaths = [Path(f) for f in filepaths]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = dict(zip(filepaths, pool.map(lambda f: blame(f, lines), filepaths)))
+    save_cache()
+    return results
@@ -0,0 +1,290 @@
+"""
+git_index - read what git already knows about a working tree
+
+.git/index holds, for every tracked file, the stat data git saw when
+it last hashed it, and the resulting blob id. when a file's stat still
+matches, git trusts that id without reading the file; so can we.
+
+reads index versions 2, 3 and 4 (sha1 repositories only). the index
+is parsed on the first file it's asked about, and the parse is kept
+until the index file changes.
+
+git's blob ids are of the cleaned bytes: with autocrlf, text/eol
+attributes or clean filters (lfs and the like), the id in the index
+isn't the id of the bytes on disk, so such repositories aren't trusted.
+"""
+
+import hashlib
+import os
+import re
+import struct
+from collections import namedtuple
+from pathlib import Path
+
+SIGNATURE = b"DIRC"
+HEADER = struct.Struct(">4sII")
+ENTRY = struct.Struct(">10I20sH")
+EXTENDED_FLAG = 0x4000
+NAME_MASK = 0x0FFF
+MODE_TYPE_MASK = 0o170000
+MODE_REGULAR = 0o100000
+
+# attributes that make git store something other than the bytes on disk
+CONVERTING_ATTRIBUTES = {"text", "eol", "crlf", "filter", "ident", "working-tree-encoding"}
+AUTOCRLF = re.compile(r"^\s*autocrlf\s*=\s*(true|input)\s*$", re.IGNORECASE | re.MULTILINE)
+
+IndexEntry = namedtuple(
+    "IndexEntry",
+    "ctime_s ctime_ns mtime_s mtime_ns dev ino mode uid gid size sha stage",
+)
+
+
+def blob_id(filepath) -> str | None:
+    """git's object id for a file's current bytes, without asking git"""
+    try:
+        size = os.stat(filepath).st_size
+        h = hashlib.sha1(b"blob %d\0" % size)
+        buf = bytearray(1 << 20)
+        view = memoryview(buf)
+        with open(filepath, "rb") as f:
+            while n := f.readinto(buf):
+                h.update(view[:n])
+        return h.hexdigest()
+    except OSError:
+        return None
+
+
+def find_git_dir(directory) -> tuple[Path, Path] | None:
+    """(work tree root, git dir) for the repository around directory"""
+    current = Path(directory).resolve()
+    while True:
+        dot_git = current / ".git"
+        if dot_git.is_dir():
+            return current, dot_git
+        if dot_git.is_file():
+            # worktrees and submodules: "gitdir: <path>"
+            try:
+                text = dot_git.read_text().strip()
+            except OSError:
+                return None
+            if text.startswith("gitdir:"):
+                git_dir = Path(text[7:].strip())
+                if not git_dir.is_absolute():
+                    git_dir = current / git_dir
+                return current, git_dir.resolve()
+            return None
+        if current.parent == current:
+            return None
+        current = current.parent
+
+
+def _varint(buf: bytes, offset: int) -> tuple[int, int]:
+    """git's offset varint, as used by index v4 path compression"""
+    c = buf[offset]
+    offset += 1
+    value = c & 0x7F
+    while c & 0x80:
+        value += 1
+        c = buf[offset]
+        offset += 1
+        value = (value << 7) + (c & 0x7F)
+    return value, offset
+
+
+def read_index(index_path) -> dict | None:
+    """parse an index file into {path: IndexEntry} (stage 0 only)"""
+    try:
+        buf = Path(index_path).read_bytes()
+    except OSError:
+        return None
+    return parse_index(buf)
+
+
+def parse_index(buf: bytes) -> dict | None:
+    """read_index, for an index already in memory"""
+    try:
+        signature, version, count = HEADER.unpack_from(buf, 0)
+    except struct.error:
+        return None
+    if signature != SIGNATURE or version not in (2, 3, 4):
+        return None
+
+    entries = {}
+    offset = HEADER.size
+    previous = b""
+    try:
+        for _ in range(count):
+            start = offset
+            fields = ENTRY.unpack_from(buf, offset)
+            offset += ENTRY.size
+            flags = fields[11]
+            if version >= 3 and flags & EXTENDED_FLAG:
+                offset += 2
+
+            if version == 4:
+                strip, offset = _varint(buf, offset)
+                end = buf.index(b"\0", offset)
+                name = previous[:len(previous) - strip] + buf[offset:end]
+                offset = end + 1
+            else:
+                end = buf.index(b"\0", offset)
+                name = buf[offset:end]
+                # entries are NUL-padded to a multiple of 8 bytes
+                offset = start + ((offset - start + len(name) + 8) & ~7)
+            previous = name
+
+            stage = (flags >> 12) & 3
+            if stage:
+                continue
+            entries[os.fsdecode(name)] = IndexEntry(*fields[:10], fields[10].hex(), stage)
+    except (struct.error, ValueError, IndexError):
+        return None
+    return entries
+
+
+def _converts(text: str) -> bool:
+    """does a .gitattributes set anything that changes bytes on the way in?"""
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        for attr in fields[1:]:
+            # -text and !text switch conversion off, or leave it unset
+            if attr[0] in "-!":
+                continue
+            if attr.split("=", 1)[0] in CONVERTING_ATTRIBUTES:
+                return True
+    return False
+
+
+def converts(work_tree: Path, git_dir: Path, entries: dict) -> bool:
+    """
+    could git's blob ids here differ from the bytes on disk? checks
+    core.autocrlf in the repository's, the user's and the system's
+    config, info/attributes and every tracked .gitattributes
+    """
+    xdg = Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config")
+    for config in (git_dir / "config", Path.home() / ".gitconfig", xdg / "git" / "config",
+                   Path("/etc/gitconfig")):
+        try:
+            if AUTOCRLF.search(config.read_text()):
+                return True
+        except (OSError, UnicodeDecodeError):
+            pass
+
+    attributes = [git_dir / "info" / "attributes"]
+    attributes += [work_tree / name for name in entries
+                   if name == ".gitattributes" or name.endswith("/.gitattributes")]
+    for path in attributes:
+        try:
+            if _converts(path.read_text()):
+                return True
+        except (OSError, UnicodeDecodeError):
+            pass
+    return False
+
+
+# index path -> (mtime_ns, size, ino, entries or None when untrusted)
+_parsed = {}
+
+
+def load_index(work_tree: Path, git_dir: Path) -> tuple[dict | None, int]:
+    """
+    (entries, index mtime_ns), reusing the last parse of this index while
+    its stat data is unchanged; entries is None when the index can't be
+    read or the repository converts content
+    """
+    index_path = git_dir / "index"
+    try:
+        with open(index_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            key = (st.st_mtime_ns, st.st_size, st.st_ino)
+            cached = _parsed.get(index_path)
+            if cached is not None and cached[:3] == key:
+                return cached[3], st.st_mtime_ns
+            buf = f.read()
+    except OSError:
+        return None, 0
+
+    entries = parse_index(buf)
+    if entries is not None and converts(work_tree, git_dir, entries):
+        entries = None
+    _parsed[index_path] = key + (entries,)
+    return entries, st.st_mtime_ns
+
+
+class IndexView:
+    """
+    the index, seen from a directory somewhere inside the work tree
+
+    clean(rel_path, st) answers with the blob id when git's recorded
+    stat data still matches the file and the entry isn't racy, else None.
+    the index is only read when clean is first asked.
+    """
+
+    def __init__(self, work_tree: Path, git_dir: Path, prefix: str):
+        self.work_tree = work_tree
+        self.git_dir = git_dir
+        self.prefix = prefix
+        self.entries = None
+        self.index_mtime_ns = 0
+        self.loaded = False
+
+    def load(self) -> dict | None:
+        if not self.loaded:
+            self.entries, self.index_mtime_ns = load_index(self.work_tree, self.git_dir)
+            self.loaded = True
+        return self.entries
+
+    @classmethod
+    def for_tree(cls, directory) -> "IndexView | None":
+        found = find_git_dir(directory)
+        if not found:
+            return None
+        work_tree, git_dir = found
+
+        # sha256 repositories use 32-byte ids; not handled here
+        try:
+            if "objectformat = sha256" in (git_dir / "config").read_text().lower():
+                return None
+        except OSError:
+            pass
+
+        if not (git_dir / "index").exists():
+            return None
+
+        rel = os.path.relpath(Path(directory).resolve(), work_tree)
+        prefix = "" if rel == "." else rel.replace(os.sep, "/") + "/"
+        return cls(work_tree, git_dir, prefix)
+
+    def clean(self, rel_path: str, st) -> str | None:
+        entries = self.load()
+        if entries is None:
+            return None
+        entry = entries.get(self.prefix + rel_path.replace(os.sep, "/"))
+        if entry is None or entry.mode & MODE_TYPE_MASK != MODE_REGULAR:
+            return None
+
+        mtime_s, mtime_ns = divmod(st.st_mtime_ns, 1_000_000_000)
+        ctime_s, ctime_ns = divmod(st.st_ctime_ns, 1_000_000_000)
+        if entry.size != st.st_size & 0xFFFFFFFF:
+            return None
+        if entry.ino != st.st_ino & 0xFFFFFFFF:
+            return None
+        if entry.mtime_s != mtime_s & 0xFFFFFFFF or entry.ctime_s != ctime_s & 0xFFFFFFFF:
+            return None
+        # git built without nanosecond support records 0 here
+        if entry.mtime_ns and entry.mtime_ns != mtime_ns:
+            return None
+        if entry.ctime_ns and entry.ctime_ns != ctime_ns:
+            return None
+
+        # racy: the file may have changed again after git hashed it,
+        # within the same timestamp the index was written in
+        if entry.mtime_ns:
+            racy = entry.mtime_s * 1_000_000_000 + entry.mtime_ns >= self.index_mtime_ns
+        else:
+            racy = entry.mtime_s >= self.index_mtime_ns // 1_000_000_000
+        if racy:
+            return None
+        return entry.sha
@@ -0,0 +1,245 @@
+"""
+ignore_rules - what not to look at
+
+node_modules, build/, __pycache__: most of the files in a work tree are
+nobody's work. rules in .gitignore syntax say which, and a walk that
+consults them never lists or hashes what they exclude.
+
+rules come from .witnessignore files anywhere in the tree, from
+.gitignore files if asked, and from patterns given on the command line
+(which act like a .witnessignore at the root, below the files). the
+syntax is git's:
+
+    build/          a directory called build, at any depth
+    /dist           dist at the top only
+    *.log           any file ending .log
+    !keep.log       ...but not this one
+    docs/**/*.tmp   .tmp files anywhere under docs
+
+a deeper file's rules override a shallower one's, and later lines
+override earlier ones. as in git, nothing inside an excluded directory
+can be brought back.
+
+each file's rules are compiled into regexes once, with one combined
+regex in front, so a path no rule touches costs a single match.
+"""
+
+import os
+import re
+
+WITNESSIGNORE = ".witnessignore"
+GITIGNORE = ".gitignore"
+
+
+def translate(pattern: str) -> str:
+    """a gitignore glob (no leading !, no trailing /) as a regex body"""
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+                if i + 2 == n:
+                    out.append(".*")
+                    i += 2
+                    continue
+                if pattern[i + 2] == "/":
+                    out.append("(?:.*/)?")
+                    i += 3
+                    continue
+            # a ** that isn't a whole path part is just a *
+            while i + 1 < n and pattern[i + 1] == "*":
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            first = i + 2 if pattern[i + 1:i + 2] in ("!", "^") else i + 1
+            end = pattern.find("]", first + 1)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\").replace("[", "\\[")
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                out.append("[" + body + "]")
+                i = end + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_rule(line: str):
+    """(regex, negated, directories only) for one line, or None for blanks and comments"""
+    line = line.rstrip("\r\n")
+    if not line or line.startswith("#"):
+        return None
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # a slash anywhere but the end ties the pattern to the ignore file's directory
+    anchored = "/" in line
+    body = translate(line[1:] if line.startswith("/") else line)
+    return ("" if anchored else "(?:.*/)?") + body + r"\Z", negated, dir_only
+
+
+class RuleSet:
+    """the rules of one file, compiled"""
+
+    def __init__(self, lines):
+        rules = [rule for rule in map(parse_rule, lines) if rule]
+        self.rules = [(re.compile(rx), negated, dir_only) for rx, negated, dir_only in rules]
+        self._any_dir = self._combine(rx for rx, _, _ in rules)
+        self._any_file = self._combine(rx for rx, _, dir_only in rules if not dir_only)
+
+    @staticmethod
+    def _combine(regexes):
+        regexes = list(regexes)
+        return re.compile("|".join(f"(?:{rx})" for rx in regexes)) if regexes else None
+
+    def match(self, path: str, is_dir: bool) -> bool | None:
+        """True if ignored, False if re-included, None if no rule speaks to path"""
+        combined = self._any_dir if is_dir else self._any_file
+        if combined is None or not combined.match(path):
+            return None
+        for rx, negated, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if rx.match(path):
+                return not negated
+        return None
+
+    def __bool__(self):
+        return bool(self.rules)
+
+
+def _file_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class IgnoreRules:
+    """
+    the ignore rules for one tree, asked about paths relative to its root
+
+    each directory's ignore files are read the first time it's asked
+    about, and checked again (one stat) after refresh(); a file that
+    didn't change isn't compiled again.
+    """
+
+    def __init__(self, root, gitignore=False, patterns=()):
+        self.root = os.fspath(root)
+        self.names = (WITNESSIGNORE, GITIGNORE) if gitignore else (WITNESSIGNORE,)
+        self.base = RuleSet(patterns)
+        self.prefix = ""
+        # rel dir -> (file keys, [RuleSet]) and the dirs checked since refresh()
+        self._dirs = {}
+        self._fresh = set()
+
+    def refresh(self):
+        """look at the ignore files again on next use (each new scan)"""
+        self._fresh.clear()
+
+    def _rules_for(self, rel_dir: str) -> list:
+        if rel_dir in self._fresh:
+            return self._dirs[rel_dir][1]
+        directory = os.path.join(self.root, rel_dir)
+        files = [os.path.join(directory, name) for name in self.names]
+        keys = tuple(_file_key(f) for f in files)
+        cached = self._dirs.get(rel_dir)
+        if cached is None or cached[0] != keys:
+            rule_sets = []
+            for f, key in zip(files, keys):
+                if key is None:
+                    continue
+                try:
+                    with open(f, encoding="utf-8", errors="replace") as fh:
+                        rule_set = RuleSet(fh)
+                except OSError:
+                    continue
+                if rule_set:
+                    rule_sets.append(rule_set)
+            cached = self._dirs[rel_dir] = (keys, rule_sets)
+        self._fresh.add(rel_dir)
+        return cached[1]
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        """
+        do the rules exclude rel itself? its parents aren't checked: a
+        walk never gets here through an excluded directory
+        """
+        if self.prefix:
+            rel = os.path.join(self.prefix, rel)
+        parts = rel.split(os.sep)
+        verdict = self.base.match("/".join(parts), is_dir)
+        for depth in range(len(parts)):
+            rules = self._rules_for(os.sep.join(parts[:depth]))
+            if not rules:
+                continue
+            below = "/".join(parts[depth:])
+            for rule_set in rules:
+                found = rule_set.match(below, is_dir)
+                if found is not None:
+                    verdict = found
+        return bool(verdict)
+
+    def excluded(self, rel: str, is_dir: bool) -> bool:
+        """is rel, or any directory it's in, excluded?"""
+        parts = rel.split(os.sep)
+        for depth in range(1, len(parts)):
+            if self.ignored(os.sep.join(parts[:depth]), True):
+                return True
+        return self.ignored(rel, is_dir)
+
+    def at(self, rel_dir: str) -> "IgnoreRules":
+        """the same rules, for paths relative to a directory inside the tree"""
+        view = object.__new__(IgnoreRules)
+        view.__dict__.update(self.__dict__)
+        view.prefix = os.path.join(self.prefix, rel_dir) if self.prefix else rel_dir
+        return view
+
+
+def options_from_argv(argv: list, remove=False) -> dict:
+    """
+    IgnoreRules options from --gitignore and any number of --ignore
+    PATTERN in argv; with remove, they are taken out of argv
+    """
+    patterns = []
+    gitignore = False
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--ignore" and i + 1 < len(argv):
+            patterns.append(argv[i + 1])
+            width = 2
+        elif argv[i] == "--gitignore":
+            gitignore = True
+            width = 1
+        else:
+            i += 1
+            continue
+        if remove:
+            del argv[i:i + width]
+        else:
+            i += width
+    return {"gitignore": gitignore, "patterns": patterns}
+
+
+def from_argv(argv: list, root) -> IgnoreRules:
+    """IgnoreRules for root from the command line"""
+    return IgnoreRules(root, **options_from_argv(argv))
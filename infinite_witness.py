@@ -31,9 +31,15 @@ WITNESSES = [
 
 
 def fingerprint(path: Path) -> str | None:
-    """get a hash of a file"""
+    """get a hash of a file, read in chunks"""
     try:
-        return hashlib.md5(path.read_bytes()).hexdigest()[:12]
+        h = hashlib.blake2b(digest_size=16)
+        buf = bytearray(1 << 20)
+        view = memoryview(buf)
+        with open(path, 'rb') as f:
+            while n := f.readinto(buf):
+                h.update(view[:n])
+        return h.hexdigest()
     except:
         return None
 
@@ -42,7 +48,7 @@ def fingerprint_function(func: Callable) -> str:
     """get a hash of a function's source code"""
     try:
         source = inspect.getsource(func)
-        return hashlib.md5(source.encode()).hexdigest()[:12]
+        return hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
     except:
         return None
 
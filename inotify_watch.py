@@ -0,0 +1,294 @@
+"""
+inotify_watch - kernel events instead of polling
+
+rather than looking again and again
+we ask the kernel to tell us
+when something is touched
+
+linux only. talks to libc directly through ctypes.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+# event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o0004000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    """find libc and the inotify entry points, once"""
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def available() -> bool:
+    """can this machine deliver inotify events?"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        libc = _load_libc()
+        return hasattr(libc, "inotify_init1")
+    except (OSError, AttributeError):
+        return False
+
+
+class InotifyWatcher:
+    """
+    recursive inotify watch over a directory tree
+
+    wait() blocks until something happens and returns the set of
+    relative paths that need a second look. an empty string in that
+    set means the queue overflowed and the whole tree must be rescanned.
+
+    if the kernel refuses a watch partway (ENOSPC: out of
+    fs.inotify.max_user_watches), error holds why, and the answer is
+    always the whole tree: the watcher can no longer see everything,
+    and its owner should fall back to polling.
+    """
+
+    def __init__(self, root, recursive=True, max_depth=None, settle=0.05, ignore=None):
+        if not available():
+            raise OSError(errno.ENOSYS, "inotify is not available here")
+
+        self.root = Path(root).resolve()
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.settle = settle
+        # an ignore_rules.IgnoreRules: excluded directories get no watch
+        self.ignore = ignore
+        self._libc = _load_libc()
+
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self.wd_to_dir = {}
+        self.dir_to_wd = {}
+        self.error = None
+        self.watch_tree("")
+        if self.error is not None:
+            self.close()
+            raise self.error
+
+    def close(self):
+        """release the inotify descriptor"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.wd_to_dir.clear()
+        self.dir_to_wd.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _depth(self, rel: str) -> int:
+        return len(rel.split(os.sep)) if rel else 0
+
+    def _wants_dir(self, rel: str) -> bool:
+        """should this directory be watched at all"""
+        if not rel:
+            return True
+        if not self.recursive:
+            return False
+        if self.max_depth is not None and self._depth(rel) >= self.max_depth:
+            return False
+        return True
+
+    def _add_watch(self, rel: str) -> bool:
+        full = os.fsencode(self.root / rel) if rel else os.fsencode(self.root)
+        wd = self._libc.inotify_add_watch(self.fd, full, WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return False
+            raise OSError(err, f"inotify_add_watch: {os.strerror(err)}")
+        self.wd_to_dir[wd] = rel
+        self.dir_to_wd[rel] = wd
+        return True
+
+    def watch_tree(self, rel: str):
+        """add watches for a directory and everything below it"""
+        pending = [rel]
+        while pending:
+            current = pending.pop()
+            if not self._wants_dir(current):
+                continue
+            try:
+                if not self._add_watch(current):
+                    continue
+            except OSError as e:
+                self.error = e
+                return
+            try:
+                with os.scandir(self.root / current if current else self.root) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            sub = os.path.join(current, entry.name) if current else entry.name
+                            if self.ignore is None or not self.ignore.ignored(sub, True):
+                                pending.append(sub)
+            except OSError:
+                pass
+
+    def unwatch_tree(self, rel: str):
+        """drop watches for a directory that moved or vanished"""
+        prefix = rel + os.sep
+        for d in [d for d in self.dir_to_wd if d == rel or d.startswith(prefix)]:
+            wd = self.dir_to_wd.pop(d)
+            self.wd_to_dir.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def rewatch(self):
+        """start over: drop every watch and walk the tree again"""
+        for wd in list(self.wd_to_dir):
+            self._libc.inotify_rm_watch(self.fd, wd)
+        self.wd_to_dir.clear()
+        self.dir_to_wd.clear()
+        self.watch_tree("")
+
+    def _read_events(self) -> list:
+        """read whatever is queued right now"""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(buf, offset)
+                offset += EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def _handle(self, events: list, dirty: set) -> bool:
+        """fold events into dirty paths, return True on overflow"""
+        overflow = False
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+
+            parent = self.wd_to_dir.get(wd)
+            if parent is None:
+                continue
+
+            if mask & IN_IGNORED:
+                self.dir_to_wd.pop(parent, None)
+                self.wd_to_dir.pop(wd, None)
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if parent == "":
+                    overflow = True
+                continue
+
+            if self.ignore is not None and name in self.ignore.names:
+                # the rules themselves changed: what's watched and what's
+                # in the state may both be wrong now
+                self.ignore.refresh()
+                overflow = True
+                continue
+
+            if not name or name.startswith('.'):
+                continue
+
+            rel = os.path.join(parent, name) if parent else name
+            if self.ignore is not None and self.ignore.ignored(rel, bool(mask & IN_ISDIR)):
+                continue
+            dirty.add(rel)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.watch_tree(rel)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.unwatch_tree(rel)
+
+        return overflow
+
+    def wait(self, timeout=None) -> set:
+        """
+        block until events arrive, then gather for a short settle window.
+        returns relative paths to rescan ("" for the whole tree).
+        """
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        ms = None if timeout is None else int(timeout * 1000)
+        if not poller.poll(ms):
+            return set()
+
+        dirty = set()
+        overflow = self.drain(dirty)
+
+        deadline = time.monotonic() + self.settle
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not poller.poll(int(remaining * 1000)):
+                break
+            overflow |= self.drain(dirty)
+
+        return self.settled(dirty, overflow)
+
+    def drain(self, dirty: set) -> bool:
+        """
+        fold whatever is queued right now into dirty, without blocking.
+        returns True if events were lost. for callers with their own
+        event loop: wait for self.fd to be readable, then drain.
+        """
+        return self._handle(self._read_events(), dirty)
+
+    def settled(self, dirty: set, overflow: bool) -> set:
+        """the answer for a batch: dirty paths, or {""} after an overflow"""
+        if self.error is not None:
+            return {""}
+        if overflow:
+            # we lost events; the only honest answer is to look again
+            self.rewatch()
+            return {""}
+        return dirty
@@ -0,0 +1,146 @@
+"""
+merkle - rollup hashes for the directories in a scan
+
+every directory gets a hash of its children: each file's name, hash,
+size and mtime, each subdirectory's name and rollup. two scans whose
+rollups agree for a directory agree on everything below it, so a diff
+never has to look inside; the root's rollup fingerprints the whole tree.
+
+a scan in walk order keeps every directory's files together, so a
+directory is also a range [start, end) of entry indexes, and skipping
+it is a jump.
+"""
+
+import hashlib
+import os
+from collections import namedtuple
+
+DIGEST_SIZE = 16
+
+DirNode = namedtuple("DirNode", "path digest start end")
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def leaf(entry: dict) -> bytes:
+    """what a file contributes to its directory's rollup"""
+    return f"{entry.get('hash')}\0{entry.get('size')}\0{entry.get('mtime')!r}".encode()
+
+
+def same_leaf(a: dict, b: dict) -> bool:
+    return leaf(a) == leaf(b)
+
+
+def rollup(items) -> list:
+    """
+    DirNodes for every directory holding files, in walk order (root "" first),
+    from (path, entry) pairs in walk order. one pass; only the current
+    directory chain is held open.
+    """
+    nodes = [["", None, 0, None]]
+    # (name, hasher, node) for the root and each open directory below it
+    stack = [("", _hasher(), nodes[0])]
+    count = 0
+
+    def close():
+        name, hasher, node = stack.pop()
+        node[1] = hasher.digest()
+        node[3] = count
+        stack[-1][1].update(b"d" + os.fsencode(name) + b"\0" + node[1])
+
+    for path, entry in items:
+        parts = path.split(os.sep)
+        dirs, name = parts[:-1], parts[-1]
+
+        common = 0
+        while common < len(dirs) and common + 1 < len(stack) and stack[common + 1][0] == dirs[common]:
+            common += 1
+        while len(stack) > common + 1:
+            close()
+        for part in dirs[common:]:
+            parent = stack[-1][2][0]
+            node = [os.path.join(parent, part) if parent else part, None, count, None]
+            nodes.append(node)
+            stack.append((part, _hasher(), node))
+
+        stack[-1][1].update(b"f" + os.fsencode(name) + b"\0" + leaf(entry) + b"\n")
+        count += 1
+
+    while len(stack) > 1:
+        close()
+    nodes[0][1] = stack[0][1].digest()
+    nodes[0][3] = count
+    return [DirNode(path, digest, start, end) for path, digest, start, end in nodes]
+
+
+def root_digest(items) -> str:
+    """the rollup of a whole scan, as hex"""
+    return rollup(items)[0].digest.hex()
+
+
+def pruned_pairs(before, after):
+    """
+    merge two scans in walk order, yielding (path, before entry, after entry)
+    with None for a missing side. where a directory's rollup is the same
+    in both, its whole range is skipped.
+
+    both scans must offer dirs() (DirNodes) and items_from(index), as
+    packed scans do.
+    """
+    from scan_store import sort_key
+
+    starts = {}
+    for node in before.dirs():
+        # walk order puts outer directories first, so the biggest skip is tried first
+        starts.setdefault(node.start, []).append(node)
+    after_nodes = {(node.start, node.path): node for node in after.dirs()}
+
+    def skip(bi, ai):
+        """where both scans go next, if a directory starting here is the same in both"""
+        for node in starts.get(bi, ()):
+            other = after_nodes.get((ai, node.path))
+            if other is not None and other.digest == node.digest:
+                return node.end, other.end
+        return None
+
+    bi = ai = 0
+    b_it = before.items_from(0)
+    a_it = after.items_from(0)
+    b = next(b_it, None)
+    a = next(a_it, None)
+
+    while b is not None or a is not None:
+        if b is not None and a is not None:
+            jump = skip(bi, ai)
+            if jump:
+                bi, ai = jump
+                b_it = before.items_from(bi)
+                a_it = after.items_from(ai)
+                b = next(b_it, None)
+                a = next(a_it, None)
+                continue
+
+        if a is None or (b is not None and sort_key(b[0]) < sort_key(a[0])):
+            yield b[0], b[1], None
+            b = next(b_it, None)
+            bi += 1
+        elif b is None or sort_key(a[0]) < sort_key(b[0]):
+            yield a[0], None, a[1]
+            a = next(a_it, None)
+            ai += 1
+        else:
+            yield a[0], b[1], a[1]
+            b = next(b_it, None)
+            a = next(a_it, None)
+            bi += 1
+            ai += 1
+
+
+def comparable(before, after) -> bool:
+    """can these two scans be diffed by rollup?"""
+    return (
+        hasattr(before, "dirs") and hasattr(after, "dirs")
+        and before.dirs() is not None and after.dirs() is not None
+    )
@@ -13,6 +13,8 @@ import hashlib
 from pathlib import Path
 from datetime import datetime
 
+import pacing
+
 # Singleton protection
 sys.path.insert(0, str(Path.home() / "workspace" / "organism"))
 try:
@@ -30,9 +32,15 @@ OBSERVATIONS_FILE = HERE / ".meta-observations.log"
 
 
 def fingerprint(path: Path) -> str | None:
-    """get a hash of a file"""
+    """get a hash of a file, read in chunks"""
     try:
-        return hashlib.md5(path.read_bytes()).hexdigest()[:12]
+        h = hashlib.blake2b(digest_size=16)
+        buf = bytearray(1 << 20)
+        view = memoryview(buf)
+        with open(path, 'rb') as f:
+            while n := f.readinto(buf):
+                h.update(view[:n])
+        return h.hexdigest()
     except:
         return None
 
@@ -109,8 +117,9 @@ def watch_once() -> None:
     print("  does it know?")
 
 
-def watch_loop(interval: float = 5.0) -> None:
-    """continuously observe witness"""
+def watch_loop(interval: float = 5.0, pacer: pacing.Pacer = None) -> None:
+    """continuously observe witness, waiting as the pacer says"""
+    pacer = pacer or pacing.Pacer(interval)
     # Singleton protection
     guard = None
     if HAS_SINGLETON:
@@ -121,7 +130,7 @@ def watch_loop(interval: float = 5.0) -> None:
 
     print("meta-witness begins observing")
     print(f"target: {WITNESS}")
-    print(f"interval: {interval}s")
+    print(f"interval: {pacing.describe(pacer)}")
     if guard:
         print("singleton: protected")
     print()
@@ -131,9 +140,11 @@ def watch_loop(interval: float = 5.0) -> None:
     state = observe_witness()
     log_observation(f"initial state: fingerprint={state['fingerprint']}")
 
+    wait = pacer.base
     try:
         while True:
-            time.sleep(interval)
+            time.sleep(wait)
+            started = time.process_time()
             new_state = observe_witness()
 
             change = describe_change(state, new_state)
@@ -141,6 +152,7 @@ def watch_loop(interval: float = 5.0) -> None:
                 log_observation(change)
 
             state = new_state
+            wait = pacer.next_wait(bool(change), time.process_time() - started)
 
     except KeyboardInterrupt:
         print()
@@ -177,7 +189,7 @@ def main():
                 interval = float(sys.argv[2])
             except ValueError:
                 pass
-        watch_loop(interval)
+        watch_loop(interval, pacing.from_argv(sys.argv, interval))
 
     elif cmd == "--history":
         show_history()
@@ -188,6 +200,7 @@ def main():
         print("usage:")
         print("  meta_witness.py           # observe once")
         print("  meta_witness.py --loop    # continuous observation")
+        print("      [interval] [--max-interval N] [--cpu-budget PCT]")
         print("  meta_witness.py --history # show observation log")
 
 
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+multi_witness - one witness, many places
+
+watching a hundred project directories shouldn't take a hundred
+processes. every root gets its own interval and priority, and one small
+pool of workers takes turns looking at whichever roots are due; when
+more are due than there are workers, the higher priority goes first.
+
+roots are polled, not watched with inotify: the kernel's per-user
+inotify limits run out long before a few hundred trees do, and polling
+keeps open descriptors bounded by the number of workers.
+
+a roots file has one root per line, optionally followed by its settings:
+
+    ~/workspace/api        interval=5 priority=2
+    ~/workspace/docs       interval=60 max_interval=600
+    # comments and blank lines are skipped
+
+a root inside another root is folded into the outer one, which takes
+the shorter interval and the higher priority of the two.
+
+with a max_interval, a root that stays quiet is looked at less and less
+often, back to its interval as soon as it changes (see pacing.py); a
+cpu budget holds each root's scanning to a share of one core.
+"""
+
+import heapq
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+# Singleton protection
+sys.path.insert(0, str(Path.home() / "workspace" / "organism"))
+try:
+    from core.singleton import Singleton
+    HAS_SINGLETON = True
+except ImportError:
+    HAS_SINGLETON = False
+
+import pacing
+import sinks
+from witness import (
+    DEFAULT_ALGORITHM,
+    HASH_ALGORITHMS,
+    change_entries,
+    compare_states,
+    describe_change,
+    scan_directory,
+)
+
+DEFAULT_INTERVAL = 10.0
+DEFAULT_JOBS = 4
+
+
+class Root:
+    """one watched directory and where it stands"""
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, priority=0, max_interval=None):
+        self.path = Path(path).expanduser().resolve()
+        self.interval = interval
+        self.priority = priority
+        self.max_interval = max_interval
+        self.state = None
+        self.due = 0.0
+
+    def __repr__(self):
+        return f"Root({str(self.path)!r}, interval={self.interval}, priority={self.priority})"
+
+
+def parse_roots_file(filepath, interval=DEFAULT_INTERVAL, max_interval=None) -> list:
+    """read roots from a file: 'path [interval=N] [max_interval=N] [priority=N]' per line"""
+    roots = []
+    for line in Path(filepath).expanduser().read_text().splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        words = line.split()
+        settings = {"interval": interval, "priority": 0, "max_interval": max_interval}
+        # settings come last, so paths may contain spaces
+        while len(words) > 1 and "=" in words[-1]:
+            key, _, value = words.pop().partition("=")
+            try:
+                settings[key] = int(value) if key == "priority" else float(value)
+            except ValueError:
+                pass
+        roots.append(Root(" ".join(words), settings["interval"], settings["priority"],
+                          settings["max_interval"]))
+    return roots
+
+
+def dedupe_roots(roots: list, fold_nested=True) -> list:
+    """
+    drop repeated roots and fold nested ones into their outer root.
+    a flat or depth-limited scan doesn't cover what's nested, so then
+    only exact repeats are folded.
+    """
+    kept = []
+    for root in sorted(roots, key=lambda r: r.path.parts):
+        outer = kept[-1] if kept else None
+        if outer is not None and (root.path == outer.path
+                                  or (fold_nested and outer.path in root.path.parents)):
+            outer.interval = min(outer.interval, root.interval)
+            outer.priority = max(outer.priority, root.priority)
+            if outer.max_interval is None or root.max_interval is None:
+                outer.max_interval = None
+            else:
+                outer.max_interval = min(outer.max_interval, root.max_interval)
+            continue
+        kept.append(root)
+    return kept
+
+
+class Scheduler:
+    """
+    scan many roots on one shared pool of workers
+
+    each root is due root.interval seconds after its last look finished,
+    stretched toward root.max_interval while it stays quiet. at most
+    `jobs` looks run at once; among roots that are due together, higher
+    priority goes first, then whichever has waited longest.
+    """
+
+    def __init__(self, roots, jobs=DEFAULT_JOBS, recursive=True, max_depth=None,
+                 algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False, cpu_budget=None):
+        self.roots = dedupe_roots(roots, fold_nested=recursive and max_depth is None)
+        self.jobs = max(1, jobs)
+        self.pacers = [pacing.Pacer(r.interval, r.max_interval, cpu_budget=cpu_budget)
+                       for r in self.roots]
+        self.scan_options = {
+            "recursive": recursive,
+            "max_depth": max_depth,
+            "algorithm": algorithm,
+            "sample_above": sample_above,
+            "escalate": escalate,
+        }
+
+    def look(self, root: Root):
+        """
+        scan one root; returns (changes, before, cpu seconds), no changes
+        on the first look
+        """
+        started = time.thread_time()
+        state = scan_directory(root.path, previous=root.state, **self.scan_options)
+        before = root.state
+        changes = compare_states(before, state) if before is not None else []
+        root.state = state
+        return changes, before, time.thread_time() - started
+
+    def run(self, report, errors=None):
+        """
+        look at roots as they come due, forever; report(root, changes,
+        before) is called from this thread after every look. errors(root,
+        exc) hears about roots that couldn't be scanned.
+        """
+        waiting = [(0.0, i) for i in range(len(self.roots))]
+        heapq.heapify(waiting)
+        ready = []
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while True:
+                now = time.monotonic()
+                while waiting and waiting[0][0] <= now:
+                    due, i = heapq.heappop(waiting)
+                    heapq.heappush(ready, (-self.roots[i].priority, due, i))
+                while ready and len(running) < self.jobs:
+                    _, _, i = heapq.heappop(ready)
+                    running[pool.submit(self.look, self.roots[i])] = i
+
+                timeout = None
+                if waiting and len(running) < self.jobs:
+                    timeout = max(0.0, waiting[0][0] - now)
+                if not running:
+                    time.sleep(timeout)
+                    continue
+
+                done, _ = wait(running, timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    root = self.roots[i]
+                    changes, busy = [], 0.0
+                    try:
+                        changes, before, busy = future.result()
+                    except OSError as e:
+                        if errors:
+                            errors(root, e)
+                    else:
+                        report(root, changes, before)
+                    root.due = time.monotonic() + self.pacers[i].next_wait(bool(changes), busy)
+                    heapq.heappush(waiting, (root.due, i))
+
+
+def witness_roots(roots, jobs=DEFAULT_JOBS, recursive=True, max_depth=None,
+                  algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False, fmt="text",
+                  cpu_budget=None):
+    """watch many roots from one process, reporting changes with full paths"""
+    sink = sinks.make_sink(fmt, describe_change)
+    if fmt == "text":
+        say = print
+    else:
+        def say(*args):
+            print(*args, file=sys.stderr)
+
+    # one process watches everything, so the usual guard still holds
+    guard = None
+    if HAS_SINGLETON:
+        guard = Singleton("witness")
+        if not guard.acquire():
+            say("witness: already running (use 'singleton check witness' to verify)")
+            return
+
+    scheduler = Scheduler(roots, jobs, recursive, max_depth, algorithm, sample_above, escalate,
+                          cpu_budget)
+    say(f"witnessing {len(scheduler.roots)} roots on {scheduler.jobs} workers")
+    if len(scheduler.roots) < len(roots):
+        say(f"({len(roots) - len(scheduler.roots)} overlapping roots folded in)")
+    for root, pacer in zip(scheduler.roots, scheduler.pacers):
+        priority = f", priority {root.priority}" if root.priority else ""
+        say(f"  {root.path}  every {pacing.describe(pacer)}{priority}")
+    say()
+
+    def report(root, changes, before):
+        if before is None:
+            say(f"initial state: {len(root.state)} files in {root.path}")
+            return
+        if not changes:
+            return
+        sink.begin()
+        for change in changes:
+            old, new = change_entries(change, before, root.state)
+            full = tuple(str(root.path / p) for p in change[1:])
+            sink.emit((change[0],) + full, old, new)
+        sink.end()
+
+    def errors(root, e):
+        say(f"cannot see {root.path}: {e.strerror or e}")
+
+    try:
+        scheduler.run(report, errors)
+    except KeyboardInterrupt:
+        say()
+        say("the watching ends")
+        say(f"final state: {sum(len(r.state or ()) for r in scheduler.roots)} files "
+            f"in {len(scheduler.roots)} roots")
+    finally:
+        sink.close()
+        if guard:
+            guard.release()
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print("usage: multi_witness.py <directory>... [options]")
+        print()
+        print("options:")
+        print("  --roots FILE  read roots from a file (path [interval=N] [max_interval=N] [priority=N])")
+        print(f"  --interval N  seconds between looks at each root (default: {DEFAULT_INTERVAL:g})")
+        print("  --max-interval N  back off on quiet roots, up to N seconds between looks")
+        print("  --cpu-budget PCT  keep each root's scanning under PCT% of one core")
+        print(f"  --jobs N      workers shared by all roots (default: {DEFAULT_JOBS})")
+        print("  --flat        only watch top-level files (no recursion)")
+        print("  --depth N     limit recursion depth")
+        print(f"  --hash NAME   hash algorithm (default: {DEFAULT_ALGORITHM})")
+        print("  --format F    output: text, jsonl, or packed (msgpack)")
+        sys.exit(1)
+
+    options = {}
+    flags = {"--flat"}
+    valued = {"--roots", "--interval", "--max-interval", "--cpu-budget", "--jobs", "--depth", "--hash",
+              "--format"}
+    paths = []
+    i = 0
+    while i < len(args):
+        if args[i] in valued and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        elif args[i] in flags:
+            options[args[i]] = True
+            i += 1
+        else:
+            paths.append(args[i])
+            i += 1
+
+    try:
+        interval = float(options.get("--interval", DEFAULT_INTERVAL))
+        jobs = int(options.get("--jobs", DEFAULT_JOBS))
+        max_depth = int(options["--depth"]) if "--depth" in options else None
+    except ValueError as e:
+        print(f"bad option: {e}")
+        sys.exit(1)
+
+    algorithm = options.get("--hash", DEFAULT_ALGORITHM)
+    if algorithm not in HASH_ALGORITHMS:
+        print(f"unknown hash: {algorithm} (choose from {', '.join(HASH_ALGORITHMS)})")
+        sys.exit(1)
+
+    paced = pacing.from_argv(sys.argv, interval)
+    max_interval = paced.max_interval if paced.max_interval > interval else None
+    roots = [Root(p, interval, max_interval=max_interval) for p in paths]
+    if "--roots" in options:
+        try:
+            roots += parse_roots_file(options["--roots"], interval, max_interval)
+        except OSError as e:
+            print(f"cannot read roots file: {e.strerror}")
+            sys.exit(1)
+
+    missing = [r for r in roots if not r.path.is_dir()]
+    for root in missing:
+        print(f"cannot witness what does not exist: {root.path}")
+    roots = [r for r in roots if r.path.is_dir()]
+    if not roots:
+        sys.exit(1)
+
+    fmt = sinks.parse_format(sys.argv)
+    witness_roots(roots, jobs, recursive="--flat" not in options, max_depth=max_depth,
+                  algorithm=algorithm, fmt=fmt, cpu_budget=paced.cpu_budget)
+
+
+if __name__ == "__main__":
+    main()
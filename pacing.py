@@ -0,0 +1,74 @@
+"""
+pacing - how long to wait before looking again
+
+a tree that hasn't changed in an hour probably won't change in the next
+second either. so each quiet look stretches the wait (by `backoff`, up
+to `max_interval`) and the first change snaps it back to `interval`.
+
+a cpu budget caps the share of one core that looking may take: if a
+look costs 0.2s of cpu and the budget is 5%, the next one waits at
+least 3.8s, however busy the tree is.
+
+with neither set, the wait is just `interval`, every time.
+"""
+
+import time
+
+
+class Pacer:
+    """the wait between looks, adapted to what the looks find"""
+
+    def __init__(self, interval, max_interval=None, backoff=2.0, cpu_budget=None):
+        self.base = interval
+        self.max_interval = max(interval, max_interval if max_interval is not None else interval)
+        self.backoff = backoff
+        self.cpu_budget = cpu_budget
+        self.interval = interval
+
+    def next_wait(self, changed: bool, busy: float = 0.0) -> float:
+        """
+        seconds to wait after a look that found changes (or not) and
+        took busy seconds of cpu
+        """
+        if changed:
+            self.interval = self.base
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        wait = self.interval
+        if self.cpu_budget:
+            # busy / (busy + wait) <= budget
+            wait = max(wait, busy * (1 - self.cpu_budget) / self.cpu_budget)
+        return wait
+
+    def sleep(self, changed: bool, busy: float = 0.0):
+        time.sleep(self.next_wait(changed, busy))
+
+
+def from_argv(argv: list, interval: float) -> Pacer:
+    """a Pacer from --max-interval SECONDS and --cpu-budget PERCENT in argv"""
+    max_interval = None
+    cpu_budget = None
+    if "--max-interval" in argv:
+        try:
+            max_interval = float(argv[argv.index("--max-interval") + 1])
+        except (IndexError, ValueError):
+            pass
+    if "--cpu-budget" in argv:
+        try:
+            cpu_budget = float(argv[argv.index("--cpu-budget") + 1].rstrip("%")) / 100
+        except (IndexError, ValueError):
+            pass
+        if cpu_budget is not None and not 0 < cpu_budget <= 1:
+            cpu_budget = None
+    return Pacer(interval, max_interval, cpu_budget=cpu_budget)
+
+
+def describe(pacer: Pacer) -> str:
+    """the pacing, in a few words, for startup banners"""
+    text = f"{pacer.base:g}s"
+    if pacer.max_interval > pacer.base:
+        text += f", up to {pacer.max_interval:g}s when quiet"
+    if pacer.cpu_budget:
+        text += f", at most {pacer.cpu_budget:.0%} cpu"
+    return text
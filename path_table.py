@@ -0,0 +1,99 @@
+"""
+path_table - directories as a tree of ids
+
+a scan of a deep tree says "proj/src/witness/core/" in front of every
+file below it. here each directory is stored once, as its parent's id
+and its own name, and the names themselves are interned, so a thousand
+directories called "tests" share one string.
+
+ids are handed out parents first, which keeps subtree queries to a
+single pass: a directory is under another if its parent is.
+
+the root directory "" is always id 0.
+"""
+
+import os
+import sys
+from array import array
+
+ROOT = 0
+
+
+class PathTable:
+    """directory paths <-> small integer ids"""
+
+    def __init__(self):
+        self._parent = array("i", [-1])
+        self._name = [""]
+        self._child = {}
+        # the last path() asked for, since files of one directory come together
+        self._last = (ROOT, "")
+
+    def __len__(self):
+        return len(self._name)
+
+    def find(self, directory: str) -> int | None:
+        """the id of a directory, or None if it was never interned"""
+        node = ROOT
+        if directory:
+            for part in directory.split(os.sep):
+                node = self._child.get((node, part))
+                if node is None:
+                    return None
+        return node
+
+    def intern(self, directory: str) -> int:
+        """the id of a directory, adding it and its parents as needed"""
+        node = ROOT
+        if directory:
+            for part in directory.split(os.sep):
+                child = self._child.get((node, part))
+                if child is None:
+                    child = len(self._name)
+                    part = sys.intern(part)
+                    self._child[(node, part)] = child
+                    self._parent.append(node)
+                    self._name.append(part)
+                node = child
+        return node
+
+    def path(self, node: int) -> str:
+        last, text = self._last
+        if node == last:
+            return text
+        parts = []
+        at = node
+        while at > ROOT:
+            parts.append(self._name[at])
+            at = self._parent[at]
+        text = os.sep.join(reversed(parts))
+        self._last = (node, text)
+        return text
+
+    def compacted(self, live) -> tuple["PathTable", dict]:
+        """
+        a new table with just the directories in live and their parents,
+        and the old id -> new id of each; ids are never freed in place
+        """
+        table = PathTable()
+        remap = {ROOT: ROOT}
+        # old ids run parents first, so new ones do too
+        for node in sorted(live):
+            if node not in remap:
+                remap[node] = table.intern(self.path(node))
+        return table, remap
+
+    def subtree(self, node: int) -> set:
+        """ids of node and every directory below it"""
+        inside = {node}
+        for child in range(node + 1, len(self._name)):
+            if self._parent[child] in inside:
+                inside.add(child)
+        return inside
+
+    def nbytes(self) -> int:
+        """memory held by the table, roughly"""
+        names = {id(name): sys.getsizeof(name) for name in self._name}
+        keys = sum(sys.getsizeof(key) for key in self._child)
+        return (self._parent.itemsize * len(self._parent) + sys.getsizeof(self._name)
+                + sum(names.values()) + sys.getsizeof(self._child) + keys)
@@ -0,0 +1,507 @@
+"""
+scan_store - a compact, memory-mappable home for scan states
+
+a saved scan is mostly repetition: paths that share their directories,
+and records that all have the same shape. so we keep paths sorted and
+front-coded, and records fixed-width, and map the file instead of
+parsing it.
+
+layout (little endian):
+    header      magic, version, hash width, restart interval, meta length,
+                entry count, offsets of the sections below, directory count
+    meta        json: path, timestamp, algorithm, root rollup
+    paths       per entry: shared prefix length (u16), suffix length (u16),
+                suffix bytes. every RESTART entries the prefix is reset,
+                so a block can be decoded on its own.
+    restarts    u64 offset of each block's first path
+    records     fixed-width: mtime, size, ino, dev, mtime_ns, ctime_ns,
+                flags, hash, sample
+    dirs        per directory, in walk order: first and past-the-end entry
+                index, path length, rollup digest, path (see merkle.py)
+
+version 1 files (no dirs section) and older json scans are still read.
+
+ScanStore keeps many of these side by side, one per watched path or
+saved name.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+import merkle
+
+MAGIC = b"WSCN"
+VERSION = 2
+RESTART = 16
+
+PREFIX = struct.Struct("<4sH")
+HEADERS = {
+    1: struct.Struct("<4sHHIIQQQQ"),
+    2: struct.Struct("<4sHHIIQQQQQQ"),
+}
+HEADER = HEADERS[VERSION]
+PATH_HEAD = struct.Struct("<HH")
+OFFSET = struct.Struct("<Q")
+DIR_HEAD = struct.Struct(f"<QQH{merkle.DIGEST_SIZE}s")
+
+HAS_HASH = 1
+HAS_STAT = 2
+HAS_SAMPLE = 4
+SAMPLED = 8
+
+
+def sort_key(path: str) -> str:
+    """order paths the way a depth-first walk in name order finds them"""
+    return path.replace(os.sep, "\0")
+
+
+def _record_struct(width: int) -> struct.Struct:
+    return struct.Struct(f"<dQQQqqB{width}s{width}s")
+
+
+def _hash_width(state: Mapping) -> int:
+    for entry in state.values():
+        for key in ("hash", "sample"):
+            if entry.get(key):
+                return len(entry[key]) // 2
+    return 0
+
+
+def _shared_prefix(a: bytes, b: bytes) -> int:
+    """length of the common prefix, by bisecting on slice equality"""
+    lo, hi = 0, min(len(a), len(b), 0xFFFF)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _encode_path(path: str) -> bytes:
+    return os.fsencode(path)
+
+
+def _decode_path(raw: bytes) -> str:
+    return os.fsdecode(raw)
+
+
+def write_scan(filepath, state: Mapping, **meta):
+    """
+    write a state to filepath, atomically
+
+    the data goes to a temporary file next to the target, is fsync'ed,
+    and then renamed over it, so readers see the old scan or the new one.
+    """
+    filepath = Path(filepath)
+    width = _hash_width(state)
+    record = _record_struct(width)
+
+    if hasattr(state, "sorted_items"):
+        # compact states sort row numbers and decode one entry at a time
+        items = state.sorted_items(sort_key)
+    else:
+        items = sorted(state.items(), key=lambda kv: sort_key(kv[0]))
+
+    paths = bytearray()
+    restarts = bytearray()
+    records = bytearray()
+    count = 0
+
+    def packed():
+        """pack each entry as the rollup goes past it, so the walk is one pass"""
+        nonlocal count
+        prev = b""
+        for i, (path, entry) in enumerate(items):
+            raw = _encode_path(path)
+            if i % RESTART == 0:
+                restarts.extend(OFFSET.pack(len(paths)))
+                shared = 0
+            else:
+                shared = _shared_prefix(prev, raw)
+            suffix = raw[shared:]
+            paths.extend(PATH_HEAD.pack(shared, len(suffix)))
+            paths.extend(suffix)
+            prev = raw
+
+            flags = 0
+            digest = entry.get("hash")
+            if digest is not None:
+                flags |= HAS_HASH
+            stat = entry.get("stat")
+            if stat:
+                flags |= HAS_STAT
+            sample = entry.get("sample")
+            if sample:
+                flags |= HAS_SAMPLE
+            if entry.get("sampled"):
+                flags |= SAMPLED
+            ino, dev, _, mtime_ns, ctime_ns = stat if stat else (0, 0, 0, 0, 0)
+
+            records.extend(record.pack(
+                entry.get("mtime", 0.0),
+                entry.get("size", 0),
+                ino, dev, mtime_ns, ctime_ns,
+                flags,
+                bytes.fromhex(digest) if digest else b"",
+                bytes.fromhex(sample) if sample else b"",
+            ))
+            count = i + 1
+            yield path, entry
+
+    nodes = merkle.rollup(packed())
+    meta["root"] = nodes[0].digest.hex()
+    meta_bytes = json.dumps(meta).encode()
+
+    dirs = bytearray()
+    for node in nodes:
+        raw = _encode_path(node.path)
+        dirs += DIR_HEAD.pack(node.start, node.end, len(raw), node.digest)
+        dirs += raw
+
+    paths_off = HEADER.size + len(meta_bytes)
+    restarts_off = paths_off + len(paths)
+    records_off = restarts_off + len(restarts)
+    dirs_off = records_off + len(records)
+    header = HEADER.pack(
+        MAGIC, VERSION, width, RESTART, len(meta_bytes),
+        count, paths_off, restarts_off, records_off, dirs_off, len(nodes),
+    )
+
+    tmp = filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in (header, meta_bytes, paths, restarts, records, dirs):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filepath)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return filepath
+
+
+class PackedState(Mapping):
+    """
+    a saved scan, read straight out of a mapped file
+
+    nothing is decoded until asked for. iteration walks the path table
+    in order; lookups binary-search the restart points.
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+        magic, version = PREFIX.unpack_from(buf, 0)
+        if magic != MAGIC or version not in HEADERS:
+            raise ValueError("not a packed scan")
+        header = HEADERS[version]
+        fields = header.unpack_from(buf, 0)
+        (_, _, width, restart, meta_len,
+         count, paths_off, restarts_off, records_off) = fields[:9]
+        self._dirs_at = fields[9:] or None
+        self._dirs = None
+        self.meta = json.loads(bytes(buf[header.size:header.size + meta_len]))
+        self._width = width
+        self._restart = restart
+        self._count = count
+        self._paths_off = paths_off
+        self._restarts_off = restarts_off
+        self._records_off = records_off
+        self._record = _record_struct(width)
+
+    def __len__(self):
+        return self._count
+
+    def _block_offset(self, block: int) -> int:
+        return self._paths_off + OFFSET.unpack_from(self._buf, self._restarts_off + block * OFFSET.size)[0]
+
+    def _paths_from(self, block: int):
+        """decode paths starting at a restart block, as (index, raw bytes)"""
+        buf = self._buf
+        off = self._block_offset(block)
+        prev = b""
+        for i in range(block * self._restart, self._count):
+            shared, n = PATH_HEAD.unpack_from(buf, off)
+            off += PATH_HEAD.size
+            raw = prev[:shared] + buf[off:off + n]
+            off += n
+            yield i, raw
+            prev = raw
+
+    def _block_head(self, block: int) -> bytes:
+        off = self._block_offset(block)
+        _, n = PATH_HEAD.unpack_from(self._buf, off)
+        off += PATH_HEAD.size
+        return self._buf[off:off + n]
+
+    def _entry(self, index: int) -> dict:
+        (mtime, size, ino, dev, mtime_ns, ctime_ns, flags,
+         digest, sample) = self._record.unpack_from(self._buf, self._records_off + index * self._record.size)
+        entry = {
+            "mtime": mtime,
+            "size": size,
+            "hash": digest.hex() if flags & HAS_HASH else None,
+        }
+        if flags & HAS_STAT:
+            entry["stat"] = [ino, dev, size, mtime_ns, ctime_ns]
+        if flags & HAS_SAMPLE:
+            entry["sample"] = sample.hex()
+        if flags & SAMPLED:
+            entry["sampled"] = True
+        return entry
+
+    def _find(self, path: str) -> int | None:
+        if not self._count:
+            return None
+        target = _encode_path(path).replace(os.fsencode(os.sep), b"\0")
+
+        def key(raw):
+            return raw.replace(os.fsencode(os.sep), b"\0")
+
+        blocks = (self._count + self._restart - 1) // self._restart
+        lo, hi = 0, blocks - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if key(self._block_head(mid)) <= target:
+                lo = mid
+            else:
+                hi = mid - 1
+
+        end = min((lo + 1) * self._restart, self._count)
+        for i, raw in self._paths_from(lo):
+            if i >= end:
+                break
+            k = key(raw)
+            if k == target:
+                return i
+            if k > target:
+                break
+        return None
+
+    def __getitem__(self, path):
+        index = self._find(path)
+        if index is None:
+            raise KeyError(path)
+        return self._entry(index)
+
+    def __contains__(self, path):
+        return self._find(path) is not None
+
+    def __iter__(self):
+        for _, raw in self._paths_from(0):
+            yield _decode_path(raw)
+
+    def items(self):
+        return self.items_from(0)
+
+    def items_from(self, index: int):
+        """(path, entry) pairs from entry number index onward"""
+        block = index // self._restart
+        for i, raw in self._paths_from(block):
+            if i >= index:
+                yield _decode_path(raw), self._entry(i)
+
+    def dirs(self) -> list | None:
+        """the directory rollups (merkle.DirNode), or None for a version 1 file"""
+        if self._dirs is None and self._dirs_at is not None:
+            off, n = self._dirs_at
+            dirs = []
+            for _ in range(n):
+                start, end, length, digest = DIR_HEAD.unpack_from(self._buf, off)
+                off += DIR_HEAD.size
+                path = _decode_path(self._buf[off:off + length])
+                off += length
+                dirs.append(merkle.DirNode(path, digest, start, end))
+            self._dirs = dirs
+        return self._dirs
+
+    def values(self):
+        for i in range(self._count):
+            yield self._entry(i)
+
+    def under(self, prefix: str):
+        """
+        (path, entry) for prefix itself and everything below it. a
+        directory is one contiguous run of entries, found from the
+        rollups; version 1 files have to read every path.
+        """
+        prefix = prefix.rstrip(os.sep)
+        index = self._find(prefix) if prefix else None
+        if index is not None:
+            yield prefix, self._entry(index)
+
+        dirs = self.dirs()
+        if dirs is None:
+            lead = _encode_path(prefix + os.sep) if prefix else b""
+            for i, raw in self._paths_from(0):
+                if raw.startswith(lead):
+                    yield _decode_path(raw), self._entry(i)
+            return
+
+        for node in dirs:
+            if node.path == prefix:
+                for i, (path, entry) in enumerate(self.items_from(node.start), node.start):
+                    if i >= node.end:
+                        break
+                    yield path, entry
+                return
+
+    def cursor(self) -> "Cursor":
+        return Cursor(self)
+
+
+class Cursor:
+    """
+    lookups for keys that arrive in sort_key order, as a walk produces them.
+    each get() only moves forward, so a whole walk costs one pass.
+    """
+
+    def __init__(self, state: Mapping):
+        self._items = iter(state.items())
+        self._current = next(self._items, None)
+
+    def get(self, path: str, default=None):
+        target = sort_key(path)
+        while self._current is not None and sort_key(self._current[0]) < target:
+            self._current = next(self._items, None)
+        if self._current is not None and self._current[0] == path:
+            return self._current[1]
+        return default
+
+
+def subtree(state: Mapping, prefix: str):
+    """(path, entry) pairs for prefix and everything under it, from any state"""
+    if hasattr(state, "under"):
+        return state.under(prefix)
+    prefix = prefix.rstrip(os.sep)
+    lead = prefix + os.sep if prefix else ""
+    return ((path, entry) for path, entry in state.items() if path == prefix or path.startswith(lead))
+
+
+def read_scan(filepath) -> dict | None:
+    """
+    read a saved scan: {"path", "timestamp", "algorithm", ..., "state"}
+
+    packed files come back with a PackedState; json files are parsed
+    as before.
+    """
+    filepath = Path(filepath)
+    try:
+        with open(filepath, "rb") as f:
+            head = f.read(len(MAGIC))
+            if head != MAGIC:
+                f.seek(0)
+                return json.loads(f.read())
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        state = PackedState(buf)
+    except (ValueError, struct.error):
+        return None
+    data = dict(state.meta)
+    data["state"] = state
+    return data
+
+
+def read_meta(filepath) -> dict | None:
+    """just the header and meta of a packed scan, plus its entry count"""
+    try:
+        with open(filepath, "rb") as f:
+            magic, version = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC or version not in HEADERS:
+                return None
+            header = HEADERS[version]
+            f.seek(0)
+            (_, _, _, _, meta_len, count, *_) = header.unpack(f.read(header.size))
+            meta = json.loads(f.read(meta_len))
+    except (OSError, ValueError, struct.error):
+        return None
+    meta["files"] = count
+    return meta
+
+
+class ScanStore:
+    """
+    many saved scans under one directory, one file per key
+
+    keys are strings like "path:/home/dev/project" or "name:before".
+    files are named by a hash of the key, and the key is kept in the
+    meta so a collision can never hand back the wrong scan.
+
+    a file's mtime is its last use. path-keyed scans beyond max_scans,
+    or unused for max_age_days, are evicted least recently used first;
+    named scans are only removed when asked.
+    """
+
+    def __init__(self, root, max_scans=64, max_age_days=90):
+        self.root = Path(root)
+        self.max_scans = max_scans
+        self.max_age_days = max_age_days
+
+    def _file(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode()).hexdigest()[:20]
+        return self.root / f"{digest}.wscan"
+
+    def save(self, key: str, state: Mapping, **meta) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        filepath = write_scan(self._file(key), state, key=key, **meta)
+        self.evict()
+        return filepath
+
+    def load(self, key: str) -> dict | None:
+        filepath = self._file(key)
+        data = read_scan(filepath)
+        if not data or data.get("key") != key:
+            return None
+        try:
+            os.utime(filepath)
+        except OSError:
+            pass
+        return data
+
+    def remove(self, key: str) -> bool:
+        try:
+            self._file(key).unlink()
+            return True
+        except OSError:
+            return False
+
+    def entries(self, prefix: str = "") -> list:
+        """meta for every stored scan whose key starts with prefix"""
+        if not self.root.exists():
+            return []
+        found = []
+        for filepath in self.root.glob("*.wscan"):
+            meta = read_meta(filepath)
+            if meta and meta.get("key", "").startswith(prefix):
+                meta["file"] = filepath
+                found.append(meta)
+        return found
+
+    def evict(self):
+        """drop stale path scans, least recently used first"""
+        scans = []
+        for meta in self.entries("path:"):
+            try:
+                scans.append((meta["file"].stat().st_mtime, meta["file"]))
+            except OSError:
+                pass
+        scans.sort(reverse=True)
+
+        cutoff = time.time() - self.max_age_days * 86400
+        for i, (last_used, filepath) in enumerate(scans):
+            if i >= self.max_scans or last_used < cutoff:
+                try:
+                    filepath.unlink()
+                except OSError:
+                    pass
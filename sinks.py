@@ -0,0 +1,185 @@
+"""
+sinks - where observations go
+
+the poetic voice is for people. pipelines want one plain record per
+change, so a sink takes change tuples and writes them out in some shape:
+
+    text     the witness's own words, one tick per block
+    jsonl    one json object per line
+    packed   one msgpack map per event, back to back
+
+every event carries a monotonic sequence number. sinks buffer writes
+and flush once per tick (end()).
+"""
+
+import json
+import struct
+import sys
+import time
+from datetime import datetime
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+FORMATS = ("text", "jsonl", "packed")
+
+
+def event_record(seq: int, change: tuple, before: dict | None, after: dict | None) -> dict:
+    """flatten a change and the entries on either side into one record"""
+    change_type, path = change[0], change[1]
+    record = {
+        "seq": seq,
+        "time": time.time(),
+        "type": change_type,
+        "path": path,
+    }
+    if change_type == "moved":
+        record["old_path"] = change[2]
+
+    current = after or before or {}
+    record["size"] = current.get("size")
+    record["mtime"] = current.get("mtime")
+    record["old_hash"] = before.get("hash") if before else None
+    record["new_hash"] = after.get("hash") if after else None
+    return record
+
+
+def _pack(obj, out: bytearray):
+    """the corner of msgpack we need: maps, strings, numbers, bools, nil"""
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True:
+        out.append(0xC3)
+    elif obj is False:
+        out.append(0xC2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out += struct.pack("b", obj)
+        elif 0 <= obj < 1 << 64:
+            out += struct.pack(">BQ", 0xCF, obj)
+        else:
+            out += struct.pack(">Bq", 0xD3, obj)
+    elif isinstance(obj, float):
+        out += struct.pack(">Bd", 0xCB, obj)
+    elif isinstance(obj, str):
+        raw = obj.encode("utf-8", "surrogateescape")
+        n = len(raw)
+        if n < 32:
+            out.append(0xA0 | n)
+        elif n < 1 << 8:
+            out += struct.pack(">BB", 0xD9, n)
+        elif n < 1 << 16:
+            out += struct.pack(">BH", 0xDA, n)
+        else:
+            out += struct.pack(">BI", 0xDB, n)
+        out += raw
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(0x80 | n)
+        else:
+            out += struct.pack(">BH", 0xDE, n)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"cannot pack {type(obj).__name__}")
+
+
+def packb(obj) -> bytes:
+    """encode obj as msgpack, with the real library when it's around"""
+    if HAS_MSGPACK:
+        return msgpack.packb(obj)
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+class Sink:
+    """base: count events, buffer, flush per tick"""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+        self.seq = 0
+        self.emitted = 0
+
+    def begin(self):
+        """a tick starts"""
+        self.emitted = 0
+
+    def emit(self, change: tuple, before: dict = None, after: dict = None):
+        self.seq += 1
+        self.emitted += 1
+        self.write(change, before, after)
+
+    def write(self, change, before, after):
+        raise NotImplementedError
+
+    def end(self):
+        """a tick is over; push out what we have"""
+        self.stream.flush()
+
+    def close(self):
+        self.end()
+
+
+class TextSink(Sink):
+    """the witness's voice: a timestamp, then one line per change"""
+
+    def __init__(self, describe, stream=None):
+        super().__init__(stream)
+        self.describe = describe
+
+    def write(self, change, before, after):
+        if self.emitted == 1:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            self.stream.write(f"[{timestamp}]\n")
+        self.stream.write(self.describe(*change) + "\n")
+
+    def end(self):
+        if self.emitted:
+            self.stream.write("\n")
+        super().end()
+
+
+class JsonlSink(Sink):
+    """one json object per change, one per line"""
+
+    def write(self, change, before, after):
+        self.stream.write(json.dumps(event_record(self.seq, change, before, after)) + "\n")
+
+
+class PackedSink(Sink):
+    """one msgpack map per change, written to a binary stream"""
+
+    def __init__(self, stream=None):
+        super().__init__(stream if stream is not None else sys.stdout.buffer)
+
+    def write(self, change, before, after):
+        self.stream.write(packb(event_record(self.seq, change, before, after)))
+
+
+def make_sink(fmt: str, describe=None, stream=None) -> Sink:
+    """a sink for a --format name"""
+    if fmt == "jsonl":
+        return JsonlSink(stream)
+    if fmt == "packed":
+        return PackedSink(stream)
+    return TextSink(describe or (lambda *change: f"  {change[0]}: {change[1]}"), stream)
+
+
+def parse_format(argv: list, default: str = "text") -> str:
+    """pull --format NAME out of an argv list"""
+    if "--format" in argv:
+        try:
+            fmt = argv[argv.index("--format") + 1]
+        except IndexError:
+            return default
+        if fmt in FORMATS:
+            return fmt
+    return default
@@ -0,0 +1,46 @@
+"""moves are told apart from unrelated files that happen to hash alike"""
+
+import unittest
+
+from witness import changes_from_pairs, hash_file
+
+
+def entry(digest, size):
+    return {"mtime": 0.0, "size": size, "hash": digest}
+
+
+class MoveTest(unittest.TestCase):
+
+    def changes(self, pairs):
+        return sorted(changes_from_pairs(pairs))
+
+    def test_empty_files_are_not_moves(self):
+        empty = entry(hash_file("/dev/null"), 0)
+        pairs = [
+            ("src/old/__init__.py", empty, None),
+            ("tests/__init__.py", None, empty),
+        ]
+        self.assertEqual(self.changes(pairs), [
+            ("created", "tests/__init__.py"),
+            ("deleted", "src/old/__init__.py"),
+        ])
+
+    def test_same_hash_different_size_is_not_a_move(self):
+        pairs = [("a", entry("ab", 10), None), ("b", None, entry("ab", 11))]
+        self.assertEqual(self.changes(pairs), [("created", "b"), ("deleted", "a")])
+
+    def test_move_prefers_the_same_name(self):
+        same = entry("cd", 5)
+        pairs = [
+            ("one/notes.txt", same, None),
+            ("two/readme.txt", same, None),
+            ("three/readme.txt", None, same),
+        ]
+        self.assertEqual(self.changes(pairs), [
+            ("deleted", "one/notes.txt"),
+            ("moved", "three/readme.txt", "two/readme.txt"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
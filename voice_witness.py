@@ -6,23 +6,24 @@ combines witness observation with voice narration
 when changes are detected, it speaks them aloud
 """
 
+import asyncio
 import sys
 import time
 import subprocess
 from pathlib import Path
 from datetime import datetime
 
-# import witness functions
-from witness import scan_directory, compare_states, hash_file
+from async_witness import AsyncWitness
+import sinks
 
 
-def speak(thought: str, pause: float = 0.3):
+def speak(thought: str, pause: float = 0.3, stream=None):
     """output a spoken thought"""
-    print(f"  > {thought}")
+    print(f"  > {thought}", file=stream or sys.stdout)
     time.sleep(pause)
 
 
-def narrate_change(change_type: str, filepath: str):
+def narrate_change(change_type: str, filepath: str, old_path: str = None):
     """narrate a file change"""
     if change_type == "created":
         speak(f"something new appeared: {filepath}")
@@ -32,51 +33,75 @@ def narrate_change(change_type: str, filepath: str):
         speak(f"this changed: {filepath}")
         speak("the bytes are different now")
 
+    elif change_type == "sampled":
+        speak(f"this seems to have changed: {filepath}")
+        speak("i only looked at pieces of it")
+
+    elif change_type == "moved":
+        speak(f"this moved: {old_path} -> {filepath}")
+        speak("same bytes, a different place")
+
     elif change_type == "deleted":
         speak(f"this is gone: {filepath}")
         speak("it was here, now it isn't")
 
 
-def watch_and_speak(path: str, interval: float = 3.0):
-    """watch a directory and narrate changes"""
+def watch_and_speak(path: str, interval: float = 3.0, fmt: str = "text"):
+    """
+    watch a directory and narrate changes
+
+    with a machine format (jsonl, packed) each change goes to stdout as
+    an event and the voice moves to stderr
+    """
     path = Path(path).resolve()
+    sink = None if fmt == "text" else sinks.make_sink(fmt)
+    voice = sys.stdout if sink is None else sys.stderr
 
-    speak("i am starting to watch")
-    speak(f"location: {path}")
-    speak(f"i will check every {interval} seconds")
-    print()
+    def say(thought: str):
+        speak(thought, stream=voice)
 
-    state = scan_directory(path)
-    speak(f"initial state: {len(state)} files")
-    speak("now i wait for changes...")
-    print()
+    say("i am starting to watch")
+    say(f"location: {path}")
+    say(f"i will check every {interval} seconds")
+    print(file=voice)
 
     try:
-        while True:
-            time.sleep(interval)
-            new_state = scan_directory(path)
-            changes = compare_states(state, new_state)
-
-            if changes:
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                speak(f"[{timestamp}] i see changes!")
-                print()
-
-                for change_type, filepath in changes:
-                    narrate_change(change_type, filepath)
-                    print()
-
-                speak(f"total changes: {len(changes)}")
-                speak("watching continues...")
+        asyncio.run(_narrate(path, interval, sink, voice, say))
+    except KeyboardInterrupt:
+        print(file=voice)
+        say("watching ends")
+        say("i was here, observing")
+        say("now i am silent")
+    finally:
+        if sink:
+            sink.close()
+
+
+async def _narrate(path: Path, interval: float, sink, voice, say):
+    async with AsyncWitness(path, interval=interval, backend="poll") as witness:
+        say(f"initial state: {len(witness.state)} files")
+        say("now i wait for changes...")
+        print(file=voice)
+
+        async for batch in witness:
+            if sink:
+                sink.begin()
+                for change in batch.changes:
+                    sink.emit(change, *batch.entries(change))
+                sink.end()
+                continue
+
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            speak(f"[{timestamp}] i see changes!")
+            print()
+
+            for change in batch.changes:
+                narrate_change(*change)
                 print()
 
-            state = new_state
-
-    except KeyboardInterrupt:
-        print()
-        speak("watching ends")
-        speak("i was here, observing")
-        speak("now i am silent")
+            speak(f"total changes: {len(batch.changes)}")
+            speak("watching continues...")
+            print()
 
 
 def main():
@@ -84,20 +109,25 @@ def main():
         print("voice_witness - witness that speaks what it sees")
         print()
         print("usage:")
-        print("  voice_witness.py <directory> [interval]")
+        print("  voice_witness.py <directory> [interval] [--format jsonl|packed]")
         print()
         print("example:")
         print("  voice_witness.py ~/workspace 5")
         return
 
-    path = sys.argv[1]
-    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    fmt = sinks.parse_format(sys.argv)
+    args = sys.argv[1:]
+    if "--format" in args:
+        idx = args.index("--format")
+        del args[idx:idx + 2]
+    path = args[0]
+    interval = float(args[1]) if len(args) > 1 else 3.0
 
     if not Path(path).exists():
         speak(f"i cannot watch what does not exist: {path}")
         return
 
-    watch_and_speak(path, interval)
+    watch_and_speak(path, interval, fmt)
 
 
 if __name__ == "__main__":
@@ -5,10 +5,12 @@ witness - a quiet observer of changes
 
 import json
 import os
-import subprocess
 import sys
 import time
 import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
@@ -20,10 +22,82 @@ try:
 except ImportError:
     HAS_SINGLETON = False
 
+import append_hash
+import git_blame
+import git_index
+from compact_state import CompactState
+import ignore_rules
+from ignore_rules import IgnoreRules
+import inotify_watch
+import merkle
+import pacing
+import scan_store
+import sinks
+HAS_INOTIFY = inotify_watch.available()
+
+# optional faster hashes
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+try:
+    import blake3
+    HAS_BLAKE3 = True
+except ImportError:
+    HAS_BLAKE3 = False
+
 HOME = Path.home()
-WITNESS_STATE_FILE = HOME / ".witness_last_scan.json"
+WITNESS_CACHE = HOME / ".witness-cache"
+SCAN_STORE = scan_store.ScanStore(WITNESS_CACHE / "scans")
+# single-slot state files from before the store
+LEGACY_STATE_FILES = (HOME / ".witness_last_scan.wscan", HOME / ".witness_last_scan.json")
 SESSION_FILE = HOME / ".witness_sessions.json"
 
+# a file touched this recently may change again within the same
+# timestamp tick, so its stat data can't vouch for its hash yet
+RACY_WINDOW_NS = 2_000_000_000
+
+# pruned polling: a directory whose mtime holds still has the same
+# entries, so it isn't listed again. files are re-stat'ed only in
+# directories that saw a change within HOT_SECONDS; a full sweep every
+# SWEEP_SECONDS catches in-place edits anywhere else
+HOT_SECONDS = 600
+SWEEP_SECONDS = 300
+
+# hashing reads through one reusable buffer per thread, whatever the
+# file's size: a mapping would die with SIGBUS if the file were
+# truncated under it (logrotate's copytruncate), a read just comes up short
+HASH_CHUNK = 1 << 20
+_hash_buffers = threading.local()
+
+# name -> (hasher factory, hex digits kept; None keeps the whole digest)
+HASH_ALGORITHMS = {
+    "md5-8": (hashlib.md5, 8),
+    "md5": (hashlib.md5, None),
+    "sha1": (hashlib.sha1, None),
+    "sha256": (hashlib.sha256, None),
+    "blake2b": (lambda: hashlib.blake2b(digest_size=16), None),
+    "blake2s": (lambda: hashlib.blake2s(digest_size=16), None),
+    # git's blob ids; scans in a work tree take clean files from .git/index
+    "git": (hashlib.sha1, None),
+}
+if HAS_XXHASH:
+    HASH_ALGORITHMS["xxh3-128"] = (xxhash.xxh3_128, None)
+if HAS_BLAKE3:
+    HASH_ALGORITHMS["blake3"] = (blake3.blake3, None)
+
+DEFAULT_ALGORITHM = "blake2b"
+
+# huge files can be fingerprinted from a sample instead of every byte:
+# the size, a head and tail block, and a few blocks spread between
+SAMPLE_EDGE = 64 * 1024
+SAMPLE_BLOCK = 4 * 1024
+SAMPLE_STRIDES = 16
+# scans saved before the algorithm was recorded used truncated md5
+LEGACY_ALGORITHM = "md5-8"
+
 
 def load_session_data() -> dict:
     """load session tracking data"""
@@ -150,6 +224,20 @@ OBSERVATIONS = {
         "left no trace:",
         "faded:",
     ],
+    "sampled": [
+        "seems to have shifted:",
+        "looks different at the edges:",
+        "stirred, from what i can see:",
+        "glimpsed changing:",
+        "moved somewhere inside:",
+    ],
+    "moved": [
+        "wandered:",
+        "found a new place:",
+        "moved quietly:",
+        "is elsewhere now:",
+        "relocated:",
+    ],
     "unchanged": [
         "remains:",
         "persists:",
@@ -160,13 +248,89 @@ OBSERVATIONS = {
 }
 
 
-def hash_file(path):
+def digest_file(path, hasher):
+    """feed a file through hasher in fixed-size chunks, so memory stays flat"""
+    with open(path, 'rb') as f:
+        buf = getattr(_hash_buffers, "buf", None)
+        if buf is None:
+            buf = _hash_buffers.buf = bytearray(HASH_CHUNK)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM):
     """get a fingerprint of a file's contents"""
+    factory, width = HASH_ALGORITHMS[algorithm]
     try:
-        with open(path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()[:8]
+        hasher = factory()
+        if algorithm == "git":
+            hasher.update(b"blob %d\0" % os.stat(path).st_size)
+        digest = digest_file(path, hasher).hexdigest()
     except (IOError, OSError):
         return None
+    return digest[:width] if width else digest
+
+
+def full_hash(path, st, algorithm=DEFAULT_ALGORITHM, appends=None):
+    """hash_file, resuming from an append_hash.AppendCache where the file only grew"""
+    if appends is None or algorithm == "git":
+        # git's blob header holds the size, so a git hash can't be resumed
+        return hash_file(path, algorithm)
+    factory, width = HASH_ALGORITHMS[algorithm]
+    digest = appends.digest(path, st, algorithm, factory)
+    return digest[:width] if digest and width else digest
+
+
+def sample_file(path, size, algorithm=DEFAULT_ALGORITHM):
+    """fingerprint a huge file from its size, its edges and strided blocks"""
+    factory, width = HASH_ALGORITHMS[algorithm]
+    h = factory()
+    h.update(size.to_bytes(8, "little"))
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            h.update(os.pread(fd, SAMPLE_EDGE, 0))
+            for i in range(1, SAMPLE_STRIDES + 1):
+                h.update(os.pread(fd, SAMPLE_BLOCK, size * i // (SAMPLE_STRIDES + 1)))
+            h.update(os.pread(fd, SAMPLE_EDGE, max(0, size - SAMPLE_EDGE)))
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    digest = h.hexdigest()
+    return digest[:width] if width else digest
+
+
+def parse_size(text: str) -> int:
+    """'512', '64K', '10M', '2G' -> bytes"""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def benchmark_hashes(size_mb=64):
+    """measure how fast each hash algorithm runs on this machine"""
+    data = os.urandom(size_mb << 20)
+    view = memoryview(data)
+    results = {}
+    for name, (factory, _) in HASH_ALGORITHMS.items():
+        if name == LEGACY_ALGORITHM:
+            continue
+        h = factory()
+        start = time.perf_counter()
+        for offset in range(0, len(data), HASH_CHUNK):
+            h.update(view[offset:offset + HASH_CHUNK])
+        h.hexdigest()
+        elapsed = time.perf_counter() - start
+        results[name] = size_mb / elapsed if elapsed else float("inf")
+    return results
 
 
 def get_content_preview(path, lines=3):
@@ -183,169 +347,713 @@ def get_content_preview(path, lines=3):
         return None
 
 
+TAIL_CHUNK = 8192
+
+
 def get_content_tail(path, lines=3):
-    """get last few lines of a text file"""
+    """
+    get last few lines of a text file
+
+    reads backwards from the end in fixed chunks until enough newlines
+    have turned up, so the cost follows the tail, not the file. lines
+    are split on b"\n" before decoding; that byte never occurs inside a
+    multi-byte utf-8 character, so every piece starts on a boundary.
+    """
     try:
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            all_lines = f.readlines()
-            tail = all_lines[-lines:] if len(all_lines) >= lines else all_lines
-            return [l.rstrip()[:60] for l in tail]
+        with open(path, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END)
+            data = b""
+            while pos > 0 and data.count(b"\n") <= lines:
+                step = min(TAIL_CHUNK, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
     except:
         return None
 
+    if not data:
+        return []
+    pieces = data.split(b"\n")
+    if data.endswith(b"\n"):
+        pieces.pop()
+    if pos > 0:
+        # the first piece started somewhere mid-line
+        pieces = pieces[1:]
+    tail = pieces[-lines:] if lines else []
+    return [p.decode('utf-8', errors='ignore').rstrip()[:60] for p in tail]
+
 
 def get_git_blame(filepath: Path, lines: int = 3) -> list:
     """get recent git blame info for a file"""
-    try:
-        # find git root
-        result = subprocess.run(
-            ["git", "rev-parse", "--show-toplevel"],
-            cwd=filepath.parent,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode != 0:
-            return None
+    return git_blame.blame(filepath, lines)
+
+
+def scan_directory(path, recursive=True, max_depth=None, previous=None, jobs=None,
+                   algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False, compact=False,
+                   appends=None, ignore=None):
+    """
+    capture the current state of a directory
+
+    with a previous state, files whose stat data is unchanged keep their
+    old hash instead of being read again (previous must have been hashed
+    with the same algorithm; a saved PackedState is read in one forward
+    pass alongside the walk). jobs > 1 hashes on a thread pool; the
+    result is in the same order either way. files of sample_above bytes
+    or more are sampled rather than read in full (see file_entry).
+
+    with the "git" algorithm inside a work tree, files whose stat data
+    matches .git/index take their blob id from there.
+
+    compact returns a CompactState instead of a dict: the same mapping,
+    at a fraction of the memory. appends (an append_hash.AppendCache)
+    lets files that only grew be hashed from where they left off.
+
+    ignore is an IgnoreRules for the walk; by default the tree's own
+    .witnessignore files are honored.
+    """
+    previous = previous or {}
+    state = CompactState() if compact else {}
+    path = Path(path)
 
-        git_root = Path(result.stdout.strip())
-        rel_path = filepath.relative_to(git_root)
-
-        # get blame with timestamps
-        result = subprocess.run(
-            ["git", "blame", "--line-porcelain", str(rel_path)],
-            cwd=git_root,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode != 0:
-            return None
+    if not path.exists():
+        return state
 
-        # parse blame output
-        blame_entries = []
-        current_entry = {}
-
-        for line in result.stdout.split("\n"):
-            if line.startswith("author "):
-                current_entry["author"] = line[7:]
-            elif line.startswith("author-time "):
-                ts = int(line[12:])
-                current_entry["time"] = datetime.fromtimestamp(ts)
-            elif line.startswith("summary "):
-                current_entry["summary"] = line[8:][:40]
-            elif line.startswith("\t"):
-                # content line - entry complete
-                if current_entry:
-                    blame_entries.append(current_entry.copy())
-                current_entry = {}
-
-        if not blame_entries:
-            return None
+    if ignore is None:
+        ignore = IgnoreRules(path)
+    lookup = previous.cursor().get if hasattr(previous, "cursor") else previous.get
+    files = (
+        (rel_path, full_path, st, prev)
+        for rel_path, full_path, st, _, prev in _files_to_hash(path, recursive, max_depth, lookup,
+                                                               algorithm, ignore)
+    )
+    state.update(file_entries(files, jobs, algorithm, sample_above, escalate, appends))
+    return state
 
-        # sort by time and return most recent
-        blame_entries.sort(key=lambda x: x.get("time", datetime.min), reverse=True)
+
+def _files_to_hash(path, recursive, max_depth, lookup, algorithm, ignore):
+    """
+    walk_files, adding each file's previous entry from lookup, and what
+    file_entry should reuse: that entry, or one vouched for by .git/index
+    """
+    index = git_index.IndexView.for_tree(path) if algorithm == "git" else None
+    for rel_path, full_path, st in walk_files(path, recursive, max_depth, ignore):
+        found = prev = lookup(rel_path)
+        if prev is None and index is not None:
+            # vouched for by git: present it as a previous entry whose
+            # stat key matches, so file_entry reuses the blob id
+            sha = index.clean(rel_path, st)
+            if sha:
+                prev = {'hash': sha, 'stat': stat_key(st)}
+        yield rel_path, full_path, st, found, prev
+
+
+def update_state(path, state, recursive=True, max_depth=None, jobs=None, algorithm=DEFAULT_ALGORITHM,
+                 sample_above=None, escalate=False, appends=None, ignore=None, before=None):
+    """
+    scan_directory with previous=state, but into state itself: yields
+    (path, old entry, new entry) for each file that came, went or changed,
+    in walk order with the departed last, ready for changes_from_pairs.
+    old entries are also kept in before, when given. nothing is sorted
+    and no second state is built, so a CompactState stays compact.
+    """
+    path = Path(path)
+    if ignore is None:
+        ignore = IgnoreRules(path)
+    before = {} if before is None else before
+    tracking = isinstance(state, CompactState)
+    if tracking:
+        state.track()
+    else:
         seen = set()
-        unique = []
-        for entry in blame_entries:
-            key = (entry.get("author"), entry.get("summary"))
-            if key not in seen:
-                seen.add(key)
-                unique.append(entry)
-                if len(unique) >= lines:
-                    break
 
-        return unique
+    # what each file had, while it's being hashed
+    found = {}
+
+    def files():
+        for rel_path, full_path, st, old, prev in _files_to_hash(path, recursive, max_depth, state.get,
+                                                                 algorithm, ignore):
+            found[rel_path] = old
+            yield rel_path, full_path, st, prev
+
+    for rel_path, entry in file_entries(files(), jobs, algorithm, sample_above, escalate, appends):
+        old = found.pop(rel_path)
+        # looking a path up was enough to mark it seen in a CompactState
+        if entry != old:
+            state[rel_path] = entry
+        if not tracking:
+            seen.add(rel_path)
+        if old is None or old.get('hash') != entry['hash']:
+            if old is not None:
+                before[rel_path] = old
+            yield rel_path, old, entry
+
+    gone = state.untouched() if tracking else [rel for rel in state if rel not in seen]
+    for rel_path in gone:
+        old = before[rel_path] = state.pop(rel_path)
+        yield rel_path, old, None
+
+
+def file_entries(files, jobs=None, algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False,
+                 appends=None):
+    """
+    (rel_path, entry) for each (rel_path, full_path, stat, previous) item,
+    in order; jobs > 1 hashes on a thread pool
+    """
+    if not jobs or jobs <= 1:
+        for rel_path, full_path, st, prev in files:
+            yield rel_path, file_entry(full_path, prev, st, algorithm, sample_above, escalate, appends)
+        return
 
-    except Exception:
-        return None
+    def entry_for(item):
+        rel_path, full_path, st, prev = item
+        return rel_path, file_entry(full_path, prev, st, algorithm, sample_above, escalate, appends)
 
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        yield from ordered_map(pool, entry_for, files, depth=jobs * 4)
 
-def scan_directory(path, recursive=True, max_depth=None):
-    """capture the current state of a directory"""
-    state = {}
-    path = Path(path)
 
-    if not path.exists():
-        return state
+def ordered_map(pool, fn, items, depth=16):
+    """
+    like pool.map, but never more than depth items in flight,
+    so a huge walk doesn't queue a future per file up front
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
-    if recursive:
-        items = path.rglob('*')
+
+def _sorted_entries(dirpath):
+    """list a directory once, in name order"""
+    try:
+        with os.scandir(dirpath) as it:
+            return iter(sorted(it, key=lambda e: e.name))
+    except OSError:
+        return iter(())
+
+
+def walk_files(path, recursive=True, max_depth=None, ignore=None):
+    """
+    walk a tree with os.scandir, yielding (rel_path, full_path, stat) per file
+
+    hidden entries, whatever ignore (an IgnoreRules) excludes, and
+    directories past max_depth are pruned before we descend into them,
+    and every file is stat'ed exactly once.
+    files come out in name order, depth first.
+    """
+    if not recursive:
+        max_depth = 1 if max_depth is None else min(max_depth, 1)
+    if ignore is not None:
+        ignore.refresh()
+
+    stack = [(_sorted_entries(os.fspath(path)), "", 1)]
+    while stack:
+        entries, prefix, depth = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+
+        # skip hidden files and common noise
+        if entry.name.startswith('.'):
+            continue
+
+        rel_path = prefix + entry.name
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if ((max_depth is None or depth < max_depth)
+                        and (ignore is None or not ignore.ignored(rel_path, True))):
+                    stack.append((_sorted_entries(entry.path), rel_path + os.sep, depth + 1))
+                continue
+            if not entry.is_file():
+                continue
+            if ignore is not None and ignore.ignored(rel_path, False):
+                continue
+            st = entry.stat()
+        except OSError:
+            continue
+
+        yield rel_path, entry.path, st
+
+
+def stat_key(st) -> list:
+    """the stat fields that must all hold still for a hash to be reused"""
+    return [st.st_ino, st.st_dev, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+
+
+def file_entry(item, previous=None, st=None, algorithm=DEFAULT_ALGORITHM,
+               sample_above=None, escalate=False, appends=None) -> dict:
+    """
+    the state we keep for a single file
+
+    the hash is reused from previous when the stat key matches. entries
+    for files modified within RACY_WINDOW_NS of the scan carry no key,
+    so the next scan reads them again (git's racy-clean rule).
+
+    files of sample_above bytes or more get a sample fingerprint. on its
+    own the sample becomes the hash and the entry is marked 'sampled';
+    with escalate, the sample only decides whether the full hash needs
+    recomputing. full hashes go through appends when given (see full_hash).
+    """
+    if st is None:
+        st = os.stat(item)
+    key = stat_key(st)
+    sample = None
+    sampled = False
+
+    if previous and previous.get('stat') == key and previous.get('hash') is not None:
+        digest = previous['hash']
+        sample = previous.get('sample')
+        sampled = previous.get('sampled', False)
+    elif sample_above is not None and st.st_size >= sample_above:
+        sample = sample_file(item, st.st_size, algorithm)
+        if not escalate:
+            digest = sample
+            sampled = True
+        elif (previous and previous.get('sample') == sample and sample is not None
+              and previous.get('hash') is not None and not previous.get('sampled')):
+            digest = previous['hash']
+        else:
+            digest = full_hash(item, st, algorithm, appends)
     else:
-        items = path.glob('*')
+        digest = full_hash(item, st, algorithm, appends)
 
-    for item in items:
-        if item.is_file():
-            rel_path = str(item.relative_to(path))
+    entry = {
+        'mtime': st.st_mtime,
+        'size': st.st_size,
+        'hash': digest,
+    }
+    if sample is not None and not sampled:
+        entry['sample'] = sample
+    if sampled:
+        entry['sampled'] = True
+    if time.time_ns() - max(st.st_mtime_ns, st.st_ctime_ns) > RACY_WINDOW_NS:
+        entry['stat'] = key
+    return entry
+
+
+class TreePoller:
+    """
+    polling that costs what the tree's churn costs, not what its size does
+
+    for every directory we keep its (inode, mtime) and the names found in
+    it. adding, removing or renaming an entry moves the mtime, so a
+    directory that holds still needn't be listed: only stat'ed. files
+    edited in place don't move their directory's mtime, so those are
+    re-stat'ed only where something changed recently ("hot" directories),
+    and everywhere on a full sweep every sweep_seconds.
+
+    scan() takes the first look and returns a state like scan_directory's;
+    update(state) brings that state up to date in place and returns the
+    changes, as rescan_paths does.
+    """
+
+    def __init__(self, path, recursive=True, max_depth=None, jobs=None, algorithm=DEFAULT_ALGORITHM,
+                 sample_above=None, escalate=False, hot_seconds=HOT_SECONDS, sweep_seconds=SWEEP_SECONDS,
+                 compact=False, appends=None, ignore=None):
+        self.root = os.fspath(Path(path))
+        self.max_depth = max_depth if recursive else (1 if max_depth is None else min(max_depth, 1))
+        self.jobs = jobs
+        self.algorithm = algorithm
+        self.sample_above = sample_above
+        self.escalate = escalate
+        self.hot_seconds = hot_seconds
+        self.sweep_seconds = sweep_seconds
+        self.compact = compact
+        self.appends = appends
+        self.ignore = ignore if ignore is not None else IgnoreRules(self.root)
+        # rel dir -> [(ino, mtime_ns) or None, file names, dir names, hot until]
+        self.dirs = {}
+        self.last_sweep = None
+
+    def _list(self, full_path, rel, depth):
+        """one directory's files (with stats) and subdirectories, hidden ones skipped"""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(full_path) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    rel_path = os.path.join(rel, entry.name) if rel else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if ((self.max_depth is None or depth < self.max_depth)
+                                    and not self.ignore.ignored(rel_path, True)):
+                                subdirs.append(entry.name)
+                        elif entry.is_file() and not self.ignore.ignored(rel_path, False):
+                            files.append((entry.name, entry.stat()))
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return sorted(files), sorted(subdirs)
+
+    def _visit(self, state, sweep, now, gone):
+        """
+        walk directories, yielding (rel_path, full_path, stat, previous) for
+        files to look at; files no longer there are added to gone
+        """
+        seen = {}
+        stack = [("", 1)]
+        while stack:
+            rel, depth = stack.pop()
+            full_path = os.path.join(self.root, rel) if rel else self.root
+            prefix = rel + os.sep if rel else ""
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            key = (st.st_ino, st.st_mtime_ns)
+            record = self.dirs.get(rel)
 
-            # skip hidden files and common noise
-            if any(part.startswith('.') for part in item.parts):
+            if sweep or record is None or record[0] != key:
+                listing = self._list(full_path, rel, depth)
+                if listing is None:
+                    continue
+                files, subdirs = listing
+                names = [name for name, _ in files]
+                if record is not None:
+                    kept = set(names)
+                    gone.extend(prefix + name for name in record[1] if name not in kept)
+                # entries may still be arriving within this mtime tick
+                trusted = key if time.time_ns() - st.st_mtime_ns > RACY_WINDOW_NS else None
+                hot_until = record[3] if record else 0.0
+                if record is not None and record[0] != key:
+                    hot_until = now + self.hot_seconds
+                record = [trusted, names, subdirs, hot_until]
+                stats = dict(files)
+            else:
+                stats = None
+            seen[rel] = record
+
+            hot = record[3] > now
+            if stats is not None or hot:
+                for name in record[1]:
+                    rel_path = prefix + name
+                    if stats is not None:
+                        file_st = stats[name]
+                    else:
+                        try:
+                            file_st = os.stat(os.path.join(full_path, name))
+                        except OSError:
+                            gone.append(rel_path)
+                            continue
+                    yield rel_path, os.path.join(full_path, name), file_st, state.get(rel_path)
+
+            for name in reversed(record[2]):
+                stack.append((prefix + name, depth + 1))
+
+        # directories we didn't get to again: removed, moved, or now ignored
+        for rel, record in self.dirs.items():
+            if rel not in seen:
+                prefix = rel + os.sep if rel else ""
+                gone.extend(prefix + name for name in record[1])
+        self.dirs = seen
+
+    def _look(self, state, pairs=None, before=None):
+        """bring state up to date in place, noting (path, old, new) for what changed"""
+        now = time.monotonic()
+        sweep = self.last_sweep is None or now - self.last_sweep >= self.sweep_seconds
+        if sweep:
+            self.last_sweep = now
+        self.ignore.refresh()
+
+        gone = []
+        changed_dirs = set()
+        for rel_path, entry in file_entries(self._visit(state, sweep, now, gone), self.jobs,
+                                            self.algorithm, self.sample_above, self.escalate,
+                                            self.appends):
+            prev = state.get(rel_path)
+            state[rel_path] = entry
+            if prev is None:
+                if pairs is not None:
+                    pairs.append((rel_path, None, entry))
                 continue
+            if prev.get('hash') != entry['hash'] or prev.get('mtime') != entry['mtime']:
+                # new files already heated their directory by moving its mtime
+                changed_dirs.add(os.path.dirname(rel_path))
+            if pairs is not None and prev.get('hash') != entry['hash']:
+                pairs.append((rel_path, prev, entry))
+                before[rel_path] = prev
+
+        for rel_path in gone:
+            prev = state.pop(rel_path, None)
+            if prev is not None and pairs is not None:
+                pairs.append((rel_path, prev, None))
+                before[rel_path] = prev
+
+        for rel in changed_dirs:
+            if rel in self.dirs:
+                self.dirs[rel][3] = now + self.hot_seconds
+
+    def scan(self) -> dict:
+        """the first look: a new state, like scan_directory's"""
+        state = CompactState() if self.compact else {}
+        self._look(state)
+        return state
 
-            # check depth if specified
-            if max_depth is not None:
-                depth = len(item.relative_to(path).parts)
-                if depth > max_depth:
+    def update(self, state) -> tuple[list, dict]:
+        """
+        look again, updating state in place. returns the changes, as
+        compare_states would, and the entries they replaced; only what
+        was relisted or re-stat'ed is compared
+        """
+        pairs = []
+        before = {}
+        self._look(state, pairs, before)
+        return list(changes_from_pairs(pairs)), before
+
+
+def rescan_paths(path, state, targets, recursive=True, max_depth=None, algorithm=DEFAULT_ALGORITHM,
+                 sample_above=None, escalate=False, appends=None, ignore=None):
+    """
+    look again at just the given relative paths, updating state in place.
+    a target may be a file, a directory (its whole subtree), or something
+    that no longer exists. "" means the whole tree.
+    returns the changes, as compare_states would, and the entries that
+    were replaced (state itself now holds the new ones).
+    """
+    path = Path(path)
+    targets = set(targets)
+    if not targets:
+        return [], {}
+    if ignore is None:
+        ignore = IgnoreRules(path)
+    ignore.refresh()
+
+    if "" in targets:
+        before = {}
+        pairs = update_state(path, state, recursive, max_depth, algorithm=algorithm,
+                             sample_above=sample_above, escalate=escalate, appends=appends,
+                             ignore=ignore, before=before)
+        return list(changes_from_pairs(pairs)), before
+
+    # files are looked up directly; only what may be a directory, now or
+    # before, needs the entries under it
+    compact = isinstance(state, CompactState)
+    before = {}
+    subtrees = []
+    for rel in targets:
+        entry = state.get(rel)
+        if entry is not None:
+            before[rel] = entry
+        elif compact or not (path / rel).is_file():
+            subtrees.append(rel)
+    if compact:
+        for rel in subtrees:
+            before.update(state.under(rel))
+    elif subtrees:
+        # a dict has no index by directory: one pass over its keys for them all
+        prefixes = tuple(rel + os.sep for rel in subtrees)
+        before.update((rel, state[rel]) for rel in state if rel.startswith(prefixes))
+
+    after = {}
+    for rel in targets:
+        full = path / rel
+        depth = len(Path(rel).parts)
+        try:
+            is_dir = full.is_dir()
+            if ignore.excluded(rel, is_dir):
+                continue
+            if is_dir:
+                if not recursive or (max_depth is not None and depth >= max_depth):
+                    continue
+                sub_depth = None if max_depth is None else max_depth - depth
+                prefix = rel + os.sep
+                sub_previous = {
+                    k[len(prefix):]: v for k, v in before.items() if k.startswith(prefix)
+                }
+                for sub_rel, entry in scan_directory(full, recursive, sub_depth, sub_previous,
+                                                       algorithm=algorithm, sample_above=sample_above,
+                                                       escalate=escalate, appends=appends,
+                                                       ignore=ignore.at(rel)).items():
+                    after[os.path.join(rel, sub_rel)] = entry
+            elif full.is_file():
+                if max_depth is not None and depth > max_depth:
                     continue
+                after[rel] = file_entry(full, before.get(rel), algorithm=algorithm,
+                                        sample_above=sample_above, escalate=escalate, appends=appends)
+        except (IOError, OSError):
+            continue
 
-            state[rel_path] = {
-                'mtime': item.stat().st_mtime,
-                'size': item.stat().st_size,
-                'hash': hash_file(item),
-            }
+    for rel in before:
+        del state[rel]
+    state.update(after)
 
-    return state
+    return compare_states(before, after), before
 
 
-def describe_change(change_type, filepath):
+def describe_change(change_type, filepath, old_path=None):
     """generate a poetic observation"""
     import random
     phrases = OBSERVATIONS.get(change_type, OBSERVATIONS["unchanged"])
+    if old_path is not None:
+        return f"  {random.choice(phrases)} {old_path} -> {filepath}"
     return f"  {random.choice(phrases)} {filepath}"
 
 
-def compare_states(before, after):
-    """find what changed between two states"""
-    changes = []
+def sorted_items(state):
+    """(path, entry) pairs in walk order; packed scans already are"""
+    if isinstance(state, scan_store.PackedState):
+        return state.items()
+    if isinstance(state, CompactState):
+        return state.sorted_items(scan_store.sort_key)
+    return sorted(state.items(), key=lambda kv: scan_store.sort_key(kv[0]))
 
-    all_files = set(before.keys()) | set(after.keys())
 
-    for filepath in sorted(all_files):
-        if filepath not in before:
-            changes.append(("created", filepath))
-        elif filepath not in after:
-            changes.append(("deleted", filepath))
-        elif before[filepath]['hash'] != after[filepath]['hash']:
-            changes.append(("modified", filepath))
+def _modification(before_entry, after_entry):
+    if before_entry['hash'] == after_entry['hash']:
+        return None
+    if before_entry.get('sampled') and after_entry.get('sampled'):
+        return "sampled"
+    return "modified"
+
+
+def merge_items(before_items, after_items):
+    """
+    merge-join two streams of (path, entry), both in walk order, into
+    (path, before entry, after entry), with None for a missing side
+    """
+    sort_key = scan_store.sort_key
+    before_it = iter(before_items)
+    after_it = iter(after_items)
+    b = next(before_it, None)
+    a = next(after_it, None)
+    bk = sort_key(b[0]) if b else None
+    ak = sort_key(a[0]) if a else None
+
+    while b is not None or a is not None:
+        if a is None or (b is not None and bk < ak):
+            yield b[0], b[1], None
+            b = next(before_it, None)
+            bk = sort_key(b[0]) if b else None
+        elif b is None or ak < bk:
+            yield a[0], None, a[1]
+            a = next(after_it, None)
+            ak = sort_key(a[0]) if a else None
+        else:
+            yield a[0], b[1], a[1]
+            b = next(before_it, None)
+            bk = sort_key(b[0]) if b else None
+            a = next(after_it, None)
+            ak = sort_key(a[0]) if a else None
+
+
+def changes_from_pairs(pairs, detect_moves=True):
+    """
+    yield changes from merged (path, before entry, after entry) triples:
+    (type, path), or ("moved", path, old_path)
+
+    modifications come out as soon as they are seen. with detect_moves,
+    creations and deletions wait until the end, where a deleted and a
+    created file with the same hash and size become one move (the one
+    with the same name, if there's a choice); only those are held in
+    memory. empty files are never moves: they all hash alike.
+    """
+    pending = []
+    for path, before_entry, after_entry in pairs:
+        if after_entry is None:
+            if detect_moves:
+                pending.append(("deleted", path, before_entry))
+            else:
+                yield ("deleted", path)
+        elif before_entry is None:
+            if detect_moves:
+                pending.append(("created", path, after_entry))
+            else:
+                yield ("created", path)
+        else:
+            change = _modification(before_entry, after_entry)
+            if change:
+                yield (change, path)
 
-    return changes
+    if not pending:
+        return
 
+    def move_key(entry):
+        if entry['hash'] is None or not entry.get('size'):
+            return None
+        return entry['hash'], entry['size']
+
+    gone = {}
+    for change_type, path, entry in pending:
+        key = move_key(entry)
+        if change_type == "deleted" and key is not None:
+            gone.setdefault(key, []).append(path)
+
+    moved_from = set()
+    moves = {}
+    for change_type, path, entry in pending:
+        candidates = gone.get(move_key(entry)) if change_type == "created" else None
+        if candidates:
+            name = os.path.basename(path)
+            old_path = next((p for p in candidates if os.path.basename(p) == name), candidates[0])
+            candidates.remove(old_path)
+            moves[path] = old_path
+            moved_from.add(old_path)
+
+    for change_type, path, _ in pending:
+        if change_type == "created" and path in moves:
+            yield ("moved", path, moves[path])
+        elif change_type == "deleted" and path in moved_from:
+            continue
+        else:
+            yield (change_type, path)
 
-def save_scan(path: str, state: dict):
-    """save scan state for later comparison"""
-    data = {
-        "path": str(path),
-        "timestamp": datetime.now().isoformat(),
-        "state": state,
-    }
-    WITNESS_STATE_FILE.write_text(json.dumps(data, indent=2))
+
+def iter_changes(before_items, after_items, detect_moves=True):
+    """changes between two streams of (path, entry), both in walk order"""
+    return changes_from_pairs(merge_items(before_items, after_items), detect_moves)
+
+
+def compare_states(before, after, detect_moves=True):
+    """
+    find what changed between two states
+
+    a difference seen only through sample fingerprints is reported as
+    "sampled" rather than "modified"; a file that disappeared while an
+    identical one appeared is reported as "moved". two saved scans are
+    compared by their directory rollups, skipping identical subtrees.
+    """
+    if merkle.comparable(before, after):
+        pairs = merkle.pruned_pairs(before, after)
+    else:
+        pairs = merge_items(sorted_items(before), sorted_items(after))
+    return list(changes_from_pairs(pairs, detect_moves))
+
+
+def save_scan(path: str, state: dict, algorithm=DEFAULT_ALGORITHM):
+    """save scan state for later comparison, one baseline per path"""
+    SCAN_STORE.save(
+        f"path:{path}",
+        state,
+        path=str(path),
+        timestamp=datetime.now().isoformat(),
+        algorithm=algorithm,
+    )
 
 
 def load_previous_scan(path: str) -> dict | None:
     """load previous scan for this path"""
-    if not WITNESS_STATE_FILE.exists():
-        return None
-
-    try:
-        data = json.loads(WITNESS_STATE_FILE.read_text())
-        if data.get("path") == str(path):
+    data = SCAN_STORE.load(f"path:{path}")
+    if data:
+        return data
+
+    for state_file in LEGACY_STATE_FILES:
+        if not state_file.exists():
+            continue
+        data = scan_store.read_scan(state_file)
+        if data and data.get("path") == str(path):
             return data
-    except:
-        pass
     return None
 
 
-def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_blame=False, greet=True):
+def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_blame=False, greet=True, jobs=None,
+                 algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False, ignore=None):
     """compare current state to previous scan"""
     if greet:
         greeting = get_session_greeting()
@@ -353,19 +1061,32 @@ def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_
         print()
 
     path = Path(path).resolve()
-    current = scan_directory(path, recursive, max_depth)
     previous_data = load_previous_scan(str(path))
+    previous = previous_data.get("state", {}) if previous_data else None
+
+    # hashes only compare within one algorithm, so diff in whatever the
+    # previous scan used
+    scan_algorithm = algorithm
+    if previous_data:
+        scan_algorithm = previous_data.get("algorithm", LEGACY_ALGORITHM)
+        if scan_algorithm not in HASH_ALGORITHMS:
+            print(f"previous scan used {scan_algorithm}, which is not available here")
+            previous_data = previous = None
+            scan_algorithm = algorithm
+
+    current = scan_directory(path, recursive, max_depth, previous=previous, jobs=jobs,
+                             algorithm=scan_algorithm, sample_above=sample_above, escalate=escalate,
+                             ignore=ignore)
 
     if not previous_data:
         print("no previous scan found for this path")
         print("running initial scan...")
         print()
-        save_scan(str(path), current)
+        save_scan(str(path), current, algorithm)
         print(f"scanned {len(current)} files")
         print("run --diff again to see changes")
         return
 
-    previous = previous_data.get("state", {})
     prev_time = previous_data.get("timestamp", "unknown")[:19]
 
     print(f"comparing to scan from {prev_time}")
@@ -377,8 +1098,9 @@ def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_
         print("  nothing has changed")
     else:
         created = [c for c in changes if c[0] == "created"]
-        modified = [c for c in changes if c[0] == "modified"]
+        modified = [c for c in changes if c[0] in ("modified", "sampled")]
         deleted = [c for c in changes if c[0] == "deleted"]
+        moved = [c for c in changes if c[0] == "moved"]
 
         if created:
             print(f"  NEW ({len(created)}):")
@@ -395,9 +1117,14 @@ def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_
             print()
 
         if modified:
+            blames = {}
+            if show_blame:
+                blames = git_blame.blame_many([path / c[1] for c in modified[:10]], 2)
+
             print(f"  MODIFIED ({len(modified)}):")
-            for _, filepath in modified[:10]:
-                print(f"    ~ {filepath}")
+            for change_type, filepath in modified[:10]:
+                note = " (sampled)" if change_type == "sampled" else ""
+                print(f"    ~ {filepath}{note}")
                 if show_content:
                     full_path = path / filepath
                     # show tail (recent changes often at end)
@@ -407,8 +1134,7 @@ def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_
                         for line in tail:
                             print(f"      | {line}")
                 if show_blame:
-                    full_path = path / filepath
-                    blame = get_git_blame(full_path, 2)
+                    blame = blames.get(path / filepath)
                     if blame:
                         print(f"      (recent blame):")
                         for entry in blame:
@@ -420,6 +1146,14 @@ def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_
                 print(f"    ... and {len(modified) - 10} more")
             print()
 
+        if moved:
+            print(f"  MOVED ({len(moved)}):")
+            for _, filepath, old_path in moved[:10]:
+                print(f"    > {old_path} -> {filepath}")
+            if len(moved) > 10:
+                print(f"    ... and {len(moved) - 10} more")
+            print()
+
         if deleted:
             print(f"  DELETED ({len(deleted)}):")
             for _, filepath in deleted[:10]:
@@ -429,18 +1163,24 @@ def witness_diff(path, recursive=True, max_depth=None, show_content=False, show_
             print()
 
     # update saved state
-    save_scan(str(path), current)
+    if scan_algorithm != algorithm:
+        print(f"re-hashing with {algorithm} (previous scan used {scan_algorithm})")
+        current = scan_directory(path, recursive, max_depth, jobs=jobs, algorithm=algorithm,
+                                 sample_above=sample_above, escalate=escalate, ignore=ignore)
+    save_scan(str(path), current, algorithm)
     print(f"saved new scan ({len(current)} files)")
 
 
-def witness_once(path, recursive=True, max_depth=None, save=False, greet=True):
+def witness_once(path, recursive=True, max_depth=None, save=False, greet=True, jobs=None,
+                 algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False, ignore=None):
     """take a single snapshot and report"""
     if greet:
         greeting = get_session_greeting()
         print(greeting)
         print()
 
-    state = scan_directory(path, recursive, max_depth)
+    state = scan_directory(path, recursive, max_depth, jobs=jobs, algorithm=algorithm,
+                           sample_above=sample_above, escalate=escalate, ignore=ignore)
 
     if not state:
         print("the directory is empty, or hidden")
@@ -454,29 +1194,119 @@ def witness_once(path, recursive=True, max_depth=None, save=False, greet=True):
         print(f"  {filepath}")
     if len(state) > 5:
         print(f"  ... and {len(state) - 5} more")
+    print(f"fingerprint: {merkle.root_digest(sorted_items(state))}")
 
     if save:
-        save_scan(str(Path(path).resolve()), state)
+        save_scan(str(Path(path).resolve()), state, algorithm)
         print()
         print("scan saved for future --diff comparison")
 
     return state
 
 
-def witness_loop(path, interval=2.0, recursive=True, max_depth=None, greet=True):
-    """watch continuously, reporting changes"""
+def change_entries(change, before, after):
+    """the entries on either side of a change"""
+    old_path = change[2] if change[0] == "moved" else change[1]
+    return before.get(old_path), after.get(change[1])
+
+
+class Coalescer:
+    """
+    hold changes back until the tree goes quiet, then report the net effect
+
+    for every path touched since the last flush we remember only the entry
+    it had before the burst; what it has now is in the live state. so a
+    file created and then modified is just created, one created and then
+    deleted is nothing at all, and a thousand rewrites are one batch.
+
+    a burst that never goes quiet is still flushed every max_wait seconds.
+    """
+
+    def __init__(self, quiet=0.0, max_wait=None):
+        self.quiet = quiet
+        self.max_wait = max_wait if max_wait is not None else quiet * 10
+        self.original = {}
+        self.first = None
+        self.last = None
+
+    def add(self, changes, before):
+        """note the paths a batch of changes touched, and their old entries"""
+        now = time.monotonic()
+        for change in changes:
+            paths = (change[1], change[2]) if change[0] == "moved" else (change[1],)
+            for rel in paths:
+                if rel not in self.original:
+                    self.original[rel] = before.get(rel)
+            if self.first is None:
+                self.first = now
+            self.last = now
+
+    def timeout(self) -> float | None:
+        """how long until a flush is due; None when nothing is pending"""
+        if self.first is None:
+            return None
+        now = time.monotonic()
+        due = min(self.last + self.quiet, self.first + self.max_wait)
+        return max(0.0, due - now)
+
+    def ready(self) -> bool:
+        return self.first is not None and self.timeout() == 0.0
+
+    def flush(self, state):
+        """the net changes since the last flush, as (changes, before, after)"""
+        before = {rel: entry for rel, entry in self.original.items() if entry is not None}
+        after = {rel: state[rel] for rel in self.original if rel in state}
+        self.original = {}
+        self.first = self.last = None
+        return compare_states(before, after), before, after
+
+
+def witness_loop(path, interval=2.0, recursive=True, max_depth=None, greet=True, backend="auto", jobs=None,
+                 algorithm=DEFAULT_ALGORITHM, sample_above=None, escalate=False, fmt="text", quiet=0.0,
+                 pacer=None, prune=False, sweep_seconds=SWEEP_SECONDS, compact=False, appends=False,
+                 ignore=None):
+    """
+    watch continuously, reporting changes
+
+    backend "inotify" waits on kernel events, "poll" rescans every interval,
+    "auto" uses inotify where the kernel offers it.
+    fmt picks the output sink (see sinks.py); for the machine formats,
+    everything that isn't an event goes to stderr.
+    with quiet > 0, changes are coalesced until nothing has happened for
+    that many seconds, and reported once as their net effect.
+    when polling, a pacing.Pacer can stretch the interval on a quiet tree
+    and hold scanning to a cpu budget, and prune skips listing directories
+    whose mtime held still (see TreePoller).
+    compact keeps the state in a CompactState, for trees too big to hold
+    as a dict per file; polling then updates it in place (update_state).
+    appends hashes growing files from where they left off (see
+    append_hash.py). ignore (an IgnoreRules) keeps excluded subtrees out
+    of the watch as well as the scans.
+    """
+    pacer = pacer or pacing.Pacer(interval)
+    if ignore is None:
+        ignore = IgnoreRules(path)
+    sink = sinks.make_sink(fmt, describe_change)
+    if fmt == "text":
+        say = print
+    else:
+        greet = False
+
+        def say(*args):
+            print(*args, file=sys.stderr)
+
     # Singleton protection
     guard = None
     if HAS_SINGLETON:
         guard = Singleton("witness")
         if not guard.acquire():
-            print("witness: already running (use 'singleton check witness' to verify)")
+            say("witness: already running (use 'singleton check witness' to verify)")
             return
 
     if greet:
         greeting = get_session_greeting()
-        print(greeting)
-        print()
+        say(greeting)
+        say()
 
     path = Path(path).resolve()
 
@@ -484,37 +1314,122 @@ def witness_loop(path, interval=2.0, recursive=True, max_depth=None, greet=True)
     if max_depth is not None:
         mode = f"depth={max_depth}"
 
-    print(f"witnessing: {path}")
-    print(f"mode: {mode}, interval: {interval}s")
+    watcher = None
+    if backend != "poll" and HAS_INOTIFY:
+        try:
+            watcher = inotify_watch.InotifyWatcher(path, recursive, max_depth, ignore=ignore)
+        except OSError as e:
+            if backend == "inotify":
+                say(f"inotify unavailable ({e.strerror}), polling instead")
+    elif backend == "inotify":
+        say("inotify unavailable, polling instead")
+
+    say(f"witnessing: {path}")
+    if watcher:
+        say(f"mode: {mode}, backend: inotify ({len(watcher.dir_to_wd)} directories)")
+    else:
+        say(f"mode: {mode}, interval: {pacing.describe(pacer)}")
     if guard:
-        print("singleton: protected")
-    print()
+        say("singleton: protected")
+    say()
 
-    state = scan_directory(path, recursive, max_depth)
-    print(f"initial state: {len(state)} files")
-    print("waiting...")
-    print()
+    appends = append_hash.AppendCache() if appends else None
+    if appends is not None:
+        say(f"appends: files over {append_hash.APPEND_MIN >> 20}M that only grew hash just their new bytes")
+
+    poller = None
+    if prune and not watcher:
+        poller = TreePoller(path, recursive, max_depth, jobs, algorithm, sample_above, escalate,
+                            sweep_seconds=sweep_seconds, compact=compact, appends=appends, ignore=ignore)
+        say(f"pruning: unchanged directories are skipped, full sweep every {sweep_seconds:g}s")
 
+    if poller:
+        state = poller.scan()
+    else:
+        state = scan_directory(path, recursive, max_depth, jobs=jobs, algorithm=algorithm,
+                               sample_above=sample_above, escalate=escalate, compact=compact,
+                               appends=appends, ignore=ignore)
+    say(f"initial state: {len(state)} files")
+    if quiet:
+        say(f"coalescing: until {quiet}s of quiet")
+    say("waiting...")
+    say()
+
+    def report(changes, before, after):
+        sink.begin()
+        for change in changes:
+            sink.emit(change, *change_entries(change, before, after))
+        sink.end()
+
+    pending = Coalescer(quiet)
+    wait = pacer.base
     try:
         while True:
-            time.sleep(interval)
-            new_state = scan_directory(path, recursive, max_depth)
-            changes = compare_states(state, new_state)
-
-            if changes:
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                print(f"[{timestamp}]")
-                for change_type, filepath in changes:
-                    print(describe_change(change_type, filepath))
-                print()
+            if watcher:
+                dirty = watcher.wait(pending.timeout())
+                if watcher.error is None or not prune:
+                    changes, before = rescan_paths(path, state, dirty, recursive, max_depth, algorithm,
+                                                   sample_above, escalate, appends, ignore)
+                else:
+                    poller = TreePoller(path, recursive, max_depth, jobs, algorithm, sample_above,
+                                        escalate, sweep_seconds=sweep_seconds, compact=compact,
+                                        appends=appends, ignore=ignore)
+                    # the poller's first look lists everything: compare it in full, once
+                    before, state = state, poller.scan()
+                    changes = compare_states(before, state)
+                if watcher.error is not None:
+                    # some directory went unwatched: events would be missed
+                    say(f"inotify: {watcher.error.strerror}, polling instead")
+                    watcher.close()
+                    watcher = None
+            elif poller:
+                time.sleep(wait)
+                started = time.process_time()
+                changes, before = poller.update(state)
+                wait = pacer.next_wait(bool(changes), time.process_time() - started)
+            elif compact:
+                time.sleep(wait)
+                started = time.process_time()
+                # into the state we have: a second one would undo the compaction
+                before = {}
+                pairs = update_state(path, state, recursive, max_depth, jobs, algorithm, sample_above,
+                                     escalate, appends, ignore, before)
+                changes = changes_from_pairs(pairs)
+                if not quiet:
+                    report(changes, before, state)
+                    wait = pacer.next_wait(bool(sink.emitted), time.process_time() - started)
+                    continue
+                changes = list(changes)
+                wait = pacer.next_wait(bool(changes), time.process_time() - started)
+            else:
+                time.sleep(wait)
+                started = time.process_time()
+                new_state = scan_directory(path, recursive, max_depth, previous=state, jobs=jobs,
+                                           algorithm=algorithm, sample_above=sample_above,
+                                           escalate=escalate, compact=compact, appends=appends,
+                                           ignore=ignore)
+                before, state = state, new_state
+                if not quiet:
+                    # nothing to hold back: report each change as the merge finds it
+                    report(iter_changes(sorted_items(before), sorted_items(state)), before, state)
+                    wait = pacer.next_wait(bool(sink.emitted), time.process_time() - started)
+                    continue
+                changes = compare_states(before, state)
+                wait = pacer.next_wait(bool(changes), time.process_time() - started)
 
-            state = new_state
+            pending.add(changes, before)
+            if not pending.ready():
+                continue
+            report(*pending.flush(state))
 
     except KeyboardInterrupt:
-        print()
-        print("the watching ends")
-        print(f"final state: {len(state)} files")
+        say()
+        say("the watching ends")
+        say(f"final state: {len(state)} files")
     finally:
+        sink.close()
+        if watcher:
+            watcher.close()
         if guard:
             guard.release()
 
@@ -522,19 +1437,45 @@ def witness_loop(path, interval=2.0, recursive=True, max_depth=None, greet=True)
 def main():
     if len(sys.argv) < 2:
         print("usage: witness.py <directory> [options]")
+        print("       witness.py --bench-hash")
         print()
         print("options:")
         print("  --loop       watch continuously for changes")
         print("  --interval N seconds between checks (default: 2)")
+        print("  --poll       rescan every interval instead of waiting on inotify")
+        print("  --max-interval N  when polling, back off on a quiet tree up to N seconds")
+        print("  --cpu-budget PCT  when polling, keep scanning under PCT% of one core")
+        print("  --prune      when polling, skip directories whose mtime held still")
+        print(f"  --sweep N    with --prune, look at everything every N seconds (default: {SWEEP_SECONDS})")
+        print("  --compact    hold the watched state in columns, not a dict per file")
+        print("  --append     hash big files that only grew (logs) from where they left off")
+        print("  --ignore PAT skip paths matching a gitignore pattern (repeatable)")
+        print("  --gitignore  honor .gitignore files too (.witnessignore always is)")
         print("  --flat       only watch top-level files (no recursion)")
         print("  --depth N    limit recursion depth")
+        print("  --jobs N     hash files on N threads")
+        print(f"  --hash NAME  hash algorithm (default: {DEFAULT_ALGORITHM})")
+        print("  --git-index  use git blob ids, taking clean files from .git/index")
+        print("  --bench-hash report hash speed per algorithm and exit (no directory needed)")
+        print("  --sample-above SIZE  fingerprint files this big (e.g. 1G) from samples")
+        print("  --escalate   with --sample-above, fully hash files whose sample changed")
         print("  --diff       compare to previous scan")
         print("  --content    show file content previews (with --diff)")
         print("  --blame      show git blame for modified files (with --diff)")
         print("  --save       save scan for future --diff")
+        print("  --format F   loop output: text, jsonl, or packed (msgpack)")
+        print("  --coalesce N hold loop changes until N seconds of quiet, report the net effect")
         print("  --no-greet   skip session greeting")
         sys.exit(1)
 
+    # a command of its own, but accepted anywhere so "witness.py DIR --bench-hash" works too
+    if "--bench-hash" in sys.argv:
+        print("hashing 64 MB in memory with each algorithm...")
+        print()
+        for name, speed in sorted(benchmark_hashes().items(), key=lambda x: -x[1]):
+            print(f"  {name:10} {speed:8.0f} MB/s")
+        return
+
     path = sys.argv[1]
     loop_mode = "--loop" in sys.argv
     diff_mode = "--diff" in sys.argv
@@ -543,6 +1484,8 @@ def main():
     blame_mode = "--blame" in sys.argv
     recursive = "--flat" not in sys.argv
     greet = "--no-greet" not in sys.argv
+    backend = "poll" if "--poll" in sys.argv or "--prune" in sys.argv else "auto"
+    fmt = sinks.parse_format(sys.argv)
 
     interval = 2.0
     if "--interval" in sys.argv:
@@ -552,6 +1495,25 @@ def main():
         except (IndexError, ValueError):
             pass
 
+    quiet = 0.0
+    if "--coalesce" in sys.argv:
+        try:
+            idx = sys.argv.index("--coalesce")
+            quiet = float(sys.argv[idx + 1])
+        except (IndexError, ValueError):
+            pass
+
+    prune = "--prune" in sys.argv
+    compact = "--compact" in sys.argv
+    appends = "--append" in sys.argv
+    sweep_seconds = SWEEP_SECONDS
+    if "--sweep" in sys.argv:
+        try:
+            idx = sys.argv.index("--sweep")
+            sweep_seconds = float(sys.argv[idx + 1])
+        except (IndexError, ValueError):
+            pass
+
     max_depth = None
     if "--depth" in sys.argv:
         try:
@@ -560,16 +1522,54 @@ def main():
         except (IndexError, ValueError):
             pass
 
+    jobs = None
+    if "--jobs" in sys.argv:
+        try:
+            idx = sys.argv.index("--jobs")
+            jobs = int(sys.argv[idx + 1])
+        except (IndexError, ValueError):
+            pass
+
+    algorithm = DEFAULT_ALGORITHM
+    if "--hash" in sys.argv:
+        try:
+            idx = sys.argv.index("--hash")
+            algorithm = sys.argv[idx + 1]
+        except IndexError:
+            pass
+    if "--git-index" in sys.argv:
+        algorithm = "git"
+    if algorithm not in HASH_ALGORITHMS:
+        print(f"unknown hash: {algorithm} (choose from {', '.join(HASH_ALGORITHMS)})")
+        sys.exit(1)
+
+    sample_above = None
+    if "--sample-above" in sys.argv:
+        try:
+            idx = sys.argv.index("--sample-above")
+            sample_above = parse_size(sys.argv[idx + 1])
+        except (IndexError, ValueError):
+            pass
+    escalate = "--escalate" in sys.argv
+
     if not Path(path).exists():
         print(f"cannot witness what does not exist: {path}")
         sys.exit(1)
+    ignore = ignore_rules.from_argv(sys.argv, path)
 
     if diff_mode:
-        witness_diff(path, recursive, max_depth, show_content=content_mode, show_blame=blame_mode, greet=greet)
+        witness_diff(path, recursive, max_depth, show_content=content_mode, show_blame=blame_mode,
+                     greet=greet, jobs=jobs, algorithm=algorithm,
+                     sample_above=sample_above, escalate=escalate, ignore=ignore)
     elif loop_mode:
-        witness_loop(path, interval, recursive, max_depth, greet=greet)
+        witness_loop(path, interval, recursive, max_depth, greet=greet, backend=backend, jobs=jobs,
+                     algorithm=algorithm, sample_above=sample_above, escalate=escalate, fmt=fmt,
+                     quiet=quiet, pacer=pacing.from_argv(sys.argv, interval),
+                     prune=prune, sweep_seconds=sweep_seconds, compact=compact, appends=appends,
+                     ignore=ignore)
     else:
-        witness_once(path, recursive, max_depth, save=save_mode, greet=greet)
+        witness_once(path, recursive, max_depth, save=save_mode, greet=greet, jobs=jobs,
+                     algorithm=algorithm, sample_above=sample_above, escalate=escalate, ignore=ignore)
 
 
 if __name__ == "__main__":